@@ -0,0 +1,112 @@
+"""
+Checks of click expiry in the client FrameQueue.
+
+Clicks queued while the server is unreachable must not be injected late, but the server must not end up with
+a button held down either. Each check fills a queue, ages clicks where needed and verifies which frames
+the sender would take out.
+
+    python -m benchmarks.click_queue
+"""
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent / "client"))
+
+from common.command import ClickEvent, Command, decode_message, encode_frame
+from sender import FramePriority, FrameQueue
+
+# Older than MAX_CLICK_AGE.
+STALE = FrameQueue.MAX_CLICK_AGE + 1.0
+
+
+def put_click(queue:FrameQueue, button:int, pressed:bool, age:float = 0.0):
+    queue.put(encode_frame(ClickEvent(button=button, pressed=pressed)), FramePriority.CLICK)
+    if age:
+        frame, priority, queued = queue.frames[-1]
+        queue.frames[-1] = (frame, priority, queued - age)
+
+
+def drain(queue:FrameQueue) -> Tuple[List[Tuple[int, bool]], int]:
+    """
+    Take out all frames like the sender does, returns clicks as (button, pressed) and number of other frames.
+    """
+    clicks = []
+    others = 0
+    while True:
+        item = queue.get(timeout=0)
+        if item is None:
+            return clicks, others
+        queue.mark_sent(item)
+        if item[1] == FramePriority.CLICK:
+            event = decode_message(item[0])
+            clicks.append((event.button, event.pressed))
+        else:
+            others += 1
+
+
+def check_stale_dropped():
+    queue = FrameQueue()
+    queue.put(encode_frame(Command(move=[1, 0, 0])))
+    put_click(queue, 0, True, age=STALE)
+    put_click(queue, 0, False, age=STALE)
+    put_click(queue, 1, True)
+    put_click(queue, 1, False)
+    clicks, others = drain(queue)
+    assert clicks == [(1, True), (1, False)], clicks
+    assert others == 1, "Non click frame dropped."
+    assert queue.clicks == 0 and not queue.pressed
+
+
+def check_pairs_and_bound():
+    queue = FrameQueue()
+    pairs = FrameQueue.MAX_CLICKS
+    for index in range(pairs):
+        put_click(queue, index % 2, True)
+        put_click(queue, index % 2, False)
+        assert queue.clicks <= FrameQueue.MAX_CLICKS, f"{queue.clicks} clicks queued."
+
+    clicks, _ = drain(queue)
+    assert len(clicks) == FrameQueue.MAX_CLICKS, f"{len(clicks)} clicks kept."
+    # The newest pairs are kept, each press followed by its release.
+    expected = [(index % 2, pressed) for index in range(pairs - FrameQueue.MAX_CLICKS // 2, pairs) for pressed in (True, False)]
+    assert clicks == expected, clicks
+    assert not queue.pressed
+
+
+def check_release_of_sent_press_kept():
+    queue = FrameQueue()
+    put_click(queue, 0, True)
+    clicks, _ = drain(queue)
+    assert clicks == [(0, True)] and queue.pressed == {0}
+
+    # Release is stale and followed by enough clicks to exceed the bound, it must still be sent.
+    put_click(queue, 0, False, age=STALE)
+    for _ in range(FrameQueue.MAX_CLICKS):
+        put_click(queue, 1, True)
+        put_click(queue, 1, False)
+    clicks, _ = drain(queue)
+    assert clicks[0] == (0, False), clicks[:2]
+    assert len(clicks) <= FrameQueue.MAX_CLICKS, f"{len(clicks)} clicks kept."
+    assert not queue.pressed, f"Buttons {queue.pressed} left pressed."
+
+
+def check_stale_press_with_queued_release():
+    queue = FrameQueue()
+    put_click(queue, 0, True, age=STALE)
+    put_click(queue, 0, False)
+    put_click(queue, 1, True)
+    clicks, _ = drain(queue)
+    # Release of a press which was never sent would be a stray edge, it goes with the press.
+    assert clicks == [(1, True)], clicks
+    assert queue.pressed == {1}
+
+
+def main():
+    for check in (check_stale_dropped, check_pairs_and_bound, check_release_of_sent_press_kept, check_stale_press_with_queued_release):
+        check()
+        print(f"{check.__name__}: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark of server-side filtering cost per tick as function of number of clients.
+
+Compares one VelocityEstimatorBank step for all clients with running separate
+RollingAverage + VelocityEstimator pipelines per client.
+
+    python -m benchmarks.estimator_bank --clients 1,10,100,1000 --ticks 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common.math import RollingAverage, VelocityEstimator, VelocityEstimatorBank
+
+
+def bench_bank(clients:int, ticks:int, samples:np.ndarray) -> float:
+    bank = VelocityEstimatorBank(dt=0.01, running_average_window=5, capacity=clients)
+    slots = np.array([bank.add_client() for _ in range(clients)])
+
+    start_time = time.perf_counter()
+    for tick in range(ticks):
+        bank.apply(slots, samples[tick])
+    return (time.perf_counter() - start_time) / ticks
+
+
+def bench_scalar(clients:int, ticks:int, samples:np.ndarray) -> float:
+    pipelines = [(RollingAverage(5), VelocityEstimator(dt=0.01)) for _ in range(clients)]
+
+    start_time = time.perf_counter()
+    for tick in range(ticks):
+        for index, (rolling_average, estimator) in enumerate(pipelines):
+            estimator.apply(rolling_average.apply(samples[tick, index]))
+    return (time.perf_counter() - start_time) / ticks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", default="1,10,100,1000")
+    parser.add_argument("--ticks", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'bank us/tick':>14} {'scalar us/tick':>16} {'bank us/client':>16}")
+    for clients in [int(value) for value in args.clients.split(",")]:
+        samples = np.random.normal(0.0, 0.5, (args.ticks, clients, 3))
+        bank_time = bench_bank(clients, args.ticks, samples)
+        scalar_time = bench_scalar(clients, min(args.ticks, max(1, 20000 // clients)), samples)
+        print(f"{clients:>8} {bank_time * 1e6:>14.1f} {scalar_time * 1e6:>16.1f} {bank_time * 1e6 / clients:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+FrameReader benchmark over a local socket pair.
+
+Writer sends command frames in bursts, reader reassembles them. Reports socket reads per frame and frame rate
+for several burst sizes, after checking that frames split at random points arrive intact and in order.
+
+    python -m benchmarks.frame_reader --frames 200000
+"""
+import argparse
+import random
+import socket
+import threading
+import time
+
+from common.command import Command, FrameReader, decode_message, encode_frame
+
+
+def check_reassembly(frames:int, seed:int):
+    """
+    Send stream cut into random chunks and verify decoded commands.
+    """
+    rng = random.Random(seed)
+    stream = b"".join(encode_frame(Command(move=[index, 0, 0])) for index in range(frames))
+    writer, reader_socket = socket.socketpair()
+
+    def write():
+        position = 0
+        while position < len(stream):
+            size = rng.randint(1, 200)
+            writer.sendall(stream[position:position + size])
+            position += size
+        writer.close()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+
+    reader = FrameReader(reader_socket, buffer_size=256)
+    received = 0
+    try:
+        while received < frames:
+            for frame in reader.read():
+                assert decode_message(frame).move[0] == received, "Frame out of order or corrupted."
+                received += 1
+    finally:
+        thread.join()
+        reader_socket.close()
+    print(f"Reassembly of {frames} randomly split frames: OK, {reader.reads} reads.")
+
+
+def run(frames:int, burst:int) -> "tuple[float, float]":
+    frame = encode_frame(Command(move=[120, -35, 0], click=[False, False], scale=1000.0, timestamp=time.perf_counter()))
+    writer, reader_socket = socket.socketpair()
+
+    def write():
+        payload = frame * burst
+        for _ in range(frames // burst):
+            writer.sendall(payload)
+        writer.close()
+
+    reader = FrameReader(reader_socket)
+    thread = threading.Thread(target=write)
+    start_time = time.perf_counter()
+    thread.start()
+
+    received = 0
+    while received < frames // burst * burst:
+        for data in reader.read():
+            decode_message(data)
+            received += 1
+    elapsed = time.perf_counter() - start_time
+    thread.join()
+    reader_socket.close()
+    return reader.reads / received, received / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200000)
+    parser.add_argument("--bursts", default="1,8,64", help="Comma separated frames per write.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    check_reassembly(10000, args.seed)
+    for burst in [int(value) for value in args.bursts.split(",")]:
+        reads_per_frame, rate = run(args.frames, burst)
+        print(f"burst {burst:4d}: {reads_per_frame:.3f} reads/frame, {rate:10.0f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark of gyroscope + accelerometer fusion per-sample cost.
+
+Compares OrientationFilter update with the matrix based device_space_to_world_space conversion
+and checks that fusion fits within given fraction of the sampling interval. Also checks that linear
+acceleration at rest is about zero when the filter is fed like the client does, with uncorrected readings
+at the client calibration offset with gains applied.
+
+    python -m benchmarks.fusion --samples 100000 --interval 0.01 --budget 0.1
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common.math import Constants, OrientationFilter, device_space_to_world_space
+
+CALIBRATION_PATH = Path(__file__).absolute().parent.parent / "client" / "calibration.json"
+
+
+def generate_samples(count:int, dt:float):
+    """
+    Slow rotation around all axes with gravity expressed in device space plus small noise.
+    """
+    t = np.arange(count) * dt
+    gyro = np.stack([0.3 * np.sin(t), 0.2 * np.cos(t), 0.1 * np.sin(0.5 * t)], axis=1)
+    acc = np.tile(Constants.EARTH_ACC, (count, 1)) + np.random.normal(0.0, 0.05, (count, 3))
+    return gyro, acc
+
+
+def rest_acceleration(calibration_path:Path, seconds:float, dt:float, settle:float) -> np.ndarray:
+    """
+    Returns mean linear acceleration of a device lying still, after `settle` seconds of convergence.
+    """
+    calibration = json.loads(calibration_path.read_text())
+    inv_gains = 1.0 / np.array(calibration["gains"])
+    rest = np.array(calibration["offset"]) * inv_gains
+
+    count = int(seconds / dt)
+    acc = rest + np.random.normal(0.0, 0.02, (count, 3))
+    fusion = OrientationFilter(gravity=float(np.linalg.norm(rest)))
+    linear = np.array([fusion.update(np.zeros(3), sample, dt).copy() for sample in acc])
+    return linear[int(settle / dt):].mean(axis=0)
+
+
+def time_per_sample(func, gyro, acc) -> float:
+    start_time = time.perf_counter()
+    for index in range(len(gyro)):
+        func(gyro[index], acc[index])
+    return (time.perf_counter() - start_time) / len(gyro)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=100000)
+    parser.add_argument("--interval", type=float, default=0.01, help="Sampling interval in seconds.")
+    parser.add_argument("--budget", type=float, default=0.1, help="Allowed fraction of sampling interval.")
+    parser.add_argument("--calibration", default=str(CALIBRATION_PATH))
+    parser.add_argument("--rest-tolerance", type=float, default=0.05, help="Allowed |acceleration| at rest [m/s^2].")
+    args = parser.parse_args()
+
+    gyro, acc = generate_samples(args.samples, args.interval)
+
+    fusion = OrientationFilter()
+    fusion_time = time_per_sample(lambda g, a: fusion.update(g, a, args.interval), gyro, acc)
+
+    orientation = np.zeros(3)
+    def matrix_update(g, a):
+        orientation[:] += g * args.interval
+        return device_space_to_world_space(a, orientation) - Constants.EARTH_ACC
+    matrix_time = time_per_sample(matrix_update, gyro, acc)
+
+    budget = args.interval * args.budget
+    print(f"OrientationFilter.update:      {fusion_time * 1e6:8.2f} us/sample")
+    print(f"device_space_to_world_space:   {matrix_time * 1e6:8.2f} us/sample")
+    print(f"budget ({args.budget:.0%} of {args.interval * 1e3:.1f} ms): {budget * 1e6:8.2f} us/sample")
+    rest = rest_acceleration(Path(args.calibration), 10.0, args.interval, settle=2.0)
+    rest_ok = bool(np.all(np.abs(rest) <= args.rest_tolerance))
+    print("linear acceleration at rest:  " + " ".join(f"{value:8.4f}" for value in rest) + " m/s^2")
+
+    passed = fusion_time <= budget and rest_ok
+    print("PASS" if passed else "FAIL")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
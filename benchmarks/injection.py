@@ -0,0 +1,90 @@
+"""
+Injection cost per command of every available MouseController backend.
+
+Applies move commands with a click every `--click-every` commands, flushing after each batch of `--batch`
+commands like the server does after coalescing. Reports time per command and write() calls per command.
+Backends which cannot be loaded here (no display for pynput, no /dev/uinput access) are skipped. Event
+encoding and batched writes of uinput backend are additionally measured against /dev/null, without a device.
+
+    python -m benchmarks.injection --commands 20000 --batch 1,8
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent / "server"))
+
+from common.command import Command
+from injection import BACKENDS, InjectionBackend, UinputBackend
+from main import MouseController
+
+
+class DevNullUinputBackend(UinputBackend):
+    """
+    Encodes and writes events like UinputBackend, but to /dev/null without creating a device.
+    """
+    name = "uinput-devnull"
+
+    def __init__(self):
+        super().__init__(path=os.devnull)
+
+    def create_device(self, device_name:str):
+        pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+def load(name:str) -> "InjectionBackend | None":
+    try:
+        return DevNullUinputBackend() if name == DevNullUinputBackend.name else BACKENDS[name]()
+    except Exception as e:
+        print(f"{name:>15}: skipped, {type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}")
+        return None
+
+
+def run(backend:InjectionBackend, commands:int, batch:int, click_every:int) -> float:
+    """
+    Returns seconds per command.
+    """
+    controller = MouseController(mouse_speed=100)
+    controller.backend = backend
+    move = Command(move=[0.02, -0.01, 0.0], click=[False, False])
+    click = Command(move=[0.0, 0.0, 0.0], click=[True, False])
+
+    start_time = time.perf_counter()
+    for index in range(commands):
+        controller.apply_command(click if click_every and index % click_every == click_every - 1 else move)
+        if index % batch == batch - 1:
+            controller.flush()
+    controller.flush()
+    return (time.perf_counter() - start_time) / commands
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commands", type=int, default=20000)
+    parser.add_argument("--batch", default="1,8", help="Comma separated commands per flush.")
+    parser.add_argument("--click-every", type=int, default=100, help="Commands per click, 0 disables clicks.")
+    parser.add_argument("--backends", default=",".join([*BACKENDS, DevNullUinputBackend.name]))
+    args = parser.parse_args()
+
+    print(f"{'backend':>15} {'batch':>6} {'us/command':>11} {'writes/command':>15}")
+    for name in args.backends.split(","):
+        backend = load(name)
+        if backend is None:
+            continue
+        try:
+            for batch in [int(value) for value in args.batch.split(",")]:
+                writes = getattr(backend, "writes", None)
+                per_command = run(backend, args.commands, batch, args.click_every)
+                writes_text = f"{(backend.writes - writes) / args.commands:.3f}" if writes is not None else "-"
+                print(f"{name:>15} {batch:>6} {per_command * 1e6:>11.2f} {writes_text:>15}")
+        finally:
+            backend.close()
+
+
+if __name__ == "__main__":
+    main()
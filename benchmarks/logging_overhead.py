@@ -0,0 +1,80 @@
+"""
+Cost of logging on the calling thread.
+
+Logs the server click message in short bursts with logging disabled, with a synchronous stream handler,
+with asynchronous handler from common.logger_config and through ThrottledLogger rate limited as in the
+server. Between bursts the queue is left to drain, like the server returning to select() after a click.
+Output goes to a temporary file. Reports calling thread time per record and number of records written.
+Process details are not collected in all modes, pass --record-details to keep them.
+
+    python -m benchmarks.logging_overhead --records 20000 --burst 4
+"""
+import argparse
+import logging
+import tempfile
+import time
+
+import common.logger_config as logger_config
+
+MODES = ("disabled", "sync", "async", "throttled")
+
+
+def run(records:int, burst:int, mode:str, output) -> "tuple[float, int]":
+    """
+    Returns calling thread seconds per record and records written.
+    """
+    logger = logging.getLogger(f"benchmark.{mode}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO if mode == "disabled" else logging.DEBUG)
+
+    output.seek(0)
+    output.truncate()
+    handler = logging.StreamHandler(output)
+    handler.setFormatter(logging.Formatter(logger_config.LOG_FORMAT))
+
+    listener = None
+    if mode in ("disabled", "sync"):
+        logger.addHandler(handler)
+    else:
+        listener = logger_config.make_async(logger, [handler])
+    if mode == "throttled":
+        logger = logger_config.ThrottledLogger(logger, logger_config.Throttle(rate=20.0))
+
+    caller_time = 0.0
+    for start in range(0, records, burst):
+        start_time = time.perf_counter()
+        for index in range(start, start + burst):
+            logger.debug("button %d %s", index & 1, "press" if index & 2 else "release")
+        caller_time += time.perf_counter() - start_time
+
+        if listener:
+            while not listener.queue.empty():
+                time.sleep(0)
+            time.sleep(0.0001)
+
+    if listener:
+        listener.stop()
+    handler.flush()
+    output.seek(0)
+    return caller_time / records, sum(1 for _ in output)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--burst", type=int, default=4, help="Records logged before the queue is left to drain.")
+    parser.add_argument("--record-details", action="store_true", help="Collect process details of every record.")
+    args = parser.parse_args()
+
+    if not args.record_details:
+        logger_config.skip_record_details()
+
+    with tempfile.TemporaryFile("w+") as output:
+        print(f"{'mode':>10} {'caller us/record':>17} {'written':>8}")
+        for mode in MODES:
+            per_record, written = run(args.records, args.burst, mode, output)
+            print(f"{mode:>10} {per_record * 1e6:>17.2f} {written:>8d}")
+
+
+if __name__ == "__main__":
+    main()
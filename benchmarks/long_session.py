@@ -0,0 +1,175 @@
+"""
+Long-session regression suite for the client filtering pipeline.
+
+Pushes hours of simulated (or recorded) accelerometer samples through the same buffering, RollingAverage and
+VelocityEstimator steps as MouseProcessorThread, as fast as possible. Every simulated minute it records
+allocated memory blocks, mean step time, median trace of VelocityEstimator.P and mean planar velocity at rest.
+Fails when a linear trend of any of them over the session exceeds its threshold.
+
+    python -m benchmarks.long_session --hours 4
+    python -m benchmarks.long_session --hours 8 traces/*.npy
+"""
+import argparse
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from common.math import RollingAverage, VelocityEstimator
+from tools.tuner import load_trace
+
+
+def simulate(rng:np.random.Generator, dt:float, samples:int, bias:np.ndarray, noise:float) -> "Tuple[np.ndarray, np.ndarray]":
+    """
+    Generate rest periods interleaved with planar strokes (one sine period of acceleration, so velocity
+    returns to zero). Returns (samples, 3) acceleration and mask of samples where device is at rest.
+    """
+    acceleration = rng.normal(0.0, noise, (samples, 3)) + bias
+    at_rest = np.ones(samples, dtype=bool)
+
+    index = int(rng.uniform(1.0, 5.0) / dt)
+    while index < samples:
+        length = int(rng.uniform(0.2, 0.6) / dt)
+        amplitude = rng.uniform(1.0, 3.0)
+        angle = rng.uniform(0.0, 2.0 * np.pi)
+        stroke = amplitude * np.sin(np.linspace(0.0, 2.0 * np.pi, length))[:min(length, samples - index)]
+        acceleration[index:index + len(stroke), 0] += stroke * np.cos(angle)
+        acceleration[index:index + len(stroke), 1] += stroke * np.sin(angle)
+        # Filter needs some time to settle after stroke, these samples are not counted as rest.
+        at_rest[index:index + length + int(0.5 / dt)] = False
+        index += length + int(rng.uniform(1.0, 5.0) / dt)
+
+    return acceleration, at_rest
+
+
+def sample_windows(args, samples_per_window:int) -> "Iterator[Tuple[np.ndarray, np.ndarray]]":
+    """
+    Yield windows of (acceleration, at_rest). Traces are repeated until session length is reached.
+    """
+    if args.traces:
+        traces = [load_trace(path, args.dt)[0] for path in args.traces]
+        stream = np.concatenate(traces)
+        at_rest = np.linalg.norm(stream[:, :2], axis=1) < args.rest_threshold
+        position = 0
+        while True:
+            indices = (np.arange(samples_per_window) + position) % len(stream)
+            position = (position + samples_per_window) % len(stream)
+            yield stream[indices], at_rest[indices]
+    else:
+        rng = np.random.default_rng(args.seed)
+        bias = np.array([args.bias, -args.bias, 0.0])
+        while True:
+            yield simulate(rng, args.dt, samples_per_window, bias, args.noise)
+
+
+def trend(values:"List[float]") -> "Tuple[float, float]":
+    """
+    Linear fit over windows. Returns (start value, change over the whole session).
+    """
+    x = np.arange(len(values))
+    slope, intercept = np.polyfit(x, values, 1)
+    return float(intercept), float(slope * (len(values) - 1))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Long-session drift and memory regression suite.")
+    parser.add_argument("traces", nargs="*", type=Path, help="Recorded traces, simulated samples are used if none given.")
+    parser.add_argument("--hours", type=float, default=4.0, help="Simulated session length.")
+    parser.add_argument("--window", type=float, default=60.0, help="Simulated seconds per measurement window.")
+    parser.add_argument("--dt", type=float, default=0.01, help="Sampling interval.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bias", type=float, default=0.02, help="Simulated accelerometer bias on x and y.")
+    parser.add_argument("--noise", type=float, default=0.05, help="Simulated accelerometer noise std.")
+    parser.add_argument("--rest-threshold", type=float, default=0.2, help="Planar acceleration considered rest in traces.")
+    parser.add_argument("--queue-size", type=int, default=1000, help="Sensor reader queue size.")
+    # Client defaults.
+    parser.add_argument("--running-average-window", type=int, default=5)
+    parser.add_argument("--process-noise-var", type=float, default=0.02)
+    parser.add_argument("--measurement-noise-var", type=float, default=0.01)
+    parser.add_argument("--inactivity-threshold", type=float, default=0.4)
+    parser.add_argument("--inactivity-time", type=float, default=0.01)
+    # Failure thresholds for change over the session.
+    parser.add_argument("--max-memory-growth", type=float, default=10000.0, help="Allocated memory blocks.")
+    parser.add_argument("--max-step-time-growth", type=float, default=0.25, help="Relative to start.")
+    parser.add_argument("--max-covariance-growth", type=float, default=0.1, help="Relative to start.")
+    parser.add_argument("--max-bias-growth", type=float, default=0.01, help="m/s.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    samples_per_window = int(args.window / args.dt)
+    windows = max(3, int(args.hours * 3600.0 / args.window))
+
+    reader_queue = deque(maxlen=args.queue_size)
+    rolling_average = RollingAverage(args.running_average_window)
+    estimator = VelocityEstimator(
+        dt=args.dt,
+        process_noise_var=args.process_noise_var,
+        measurement_noise_var=args.measurement_noise_var,
+        inactivity_threshold=args.inactivity_threshold,
+        inactivity_time_threshold=args.inactivity_time,
+    )
+
+    memory, step_time, covariance, bias = [], [], [], []
+    speed = np.empty((samples_per_window, 2))
+    covariance_trace = np.empty(samples_per_window)
+
+    start_time = time.perf_counter()
+    source = sample_windows(args, samples_per_window)
+    print("hour |     blocks | step us | trace(P) | rest speed m/s")
+
+    for window in range(windows):
+        acceleration, at_rest = next(source)
+        timestamp = window * args.window
+
+        window_start_time = time.perf_counter()
+        for index, sample in enumerate(acceleration):
+            reader_queue.append((timestamp + index * args.dt, sample))
+            _, reading = reader_queue.popleft()
+            velocity = estimator.apply(rolling_average.apply(reading))
+            speed[index] = velocity[:2]
+            covariance_trace[index] = estimator.P.trace()
+        step_time.append((time.perf_counter() - window_start_time) / samples_per_window)
+
+        # Unlike tracemalloc, allocated block count adds no overhead to the measured steps.
+        memory.append(sys.getallocatedblocks())
+        covariance.append(float(np.median(covariance_trace)))
+        rest_speed = np.linalg.norm(speed[at_rest], axis=1)
+        bias.append(float(rest_speed.mean()) if len(rest_speed) else 0.0)
+
+        if not np.isfinite(estimator.P).all():
+            print(f"FAIL: VelocityEstimator.P is not finite after {timestamp / 3600.0:.2f}h.")
+            return 1
+
+        if (window + 1) % max(1, int(3600.0 / args.window)) == 0 or window == windows - 1:
+            print(
+                f"{(window + 1) * args.window / 3600.0:4.1f} | {memory[-1]:10d} | {step_time[-1] * 1e6:7.1f} | "
+                f"{covariance[-1]:8.4f} | {bias[-1]:.4f}"
+            )
+
+    print(f"Simulated {windows * args.window / 3600.0:.1f}h in {time.perf_counter() - start_time:.1f}s.")
+
+    # First window includes warm-up allocations and filter convergence.
+    checks = [
+        ("memory", trend(memory[1:]), lambda start, change: change, args.max_memory_growth, " blocks"),
+        ("step time", trend(step_time[1:]), lambda start, change: change / start, args.max_step_time_growth, ""),
+        ("covariance", trend(covariance[1:]), lambda start, change: change / start, args.max_covariance_growth, ""),
+        ("rest speed", trend(bias[1:]), lambda start, change: change, args.max_bias_growth, "m/s"),
+    ]
+
+    failed = False
+    for name, (start, change), growth, threshold, unit in checks:
+        value = growth(start, change)
+        ok = value <= threshold
+        failed |= not ok
+        print(f"{name}: growth {value:.4g}{unit} (threshold {threshold:g}{unit}) {'PASS' if ok else 'FAIL'}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+"""
+Headless plotter ingest benchmark.
+
+Runs PlotterWindow on offscreen Qt platform, feeds it blocks directly through a local queue and searches
+for the highest ingest rate at which a refresh tick (ingest + render) still fits into the refresh interval.
+
+    python -m benchmarks.plotter --npoints 1000 --channels 6 --sources 2
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from queue import SimpleQueue
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent / "plotter"))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from common.plot_block import PlotBlock
+from common.profiler import Histogram
+from config import PlotConfig
+from pyqt_plotter import Plotter
+
+
+def run_trial(plotter:Plotter, queue:SimpleQueue, items, blocks_per_tick:int, ticks:int) -> "tuple[Histogram, Histogram]":
+    """
+    Feed blocks_per_tick blocks from every source before each tick. Returns tick and update_plot time histograms.
+    """
+    window = plotter.plotter_window
+    window.reset_stats()
+    tick_time = Histogram()
+
+    for _ in range(ticks):
+        for _ in range(blocks_per_tick):
+            for item in items:
+                queue.put(item)
+
+        start_time = time.perf_counter()
+        window.update_plot()
+        plotter.app.processEvents()
+        tick_time.record(time.perf_counter() - start_time)
+
+    return tick_time, window.frame_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--npoints", type=int, default=1000)
+    parser.add_argument("--channels", type=int, default=6)
+    parser.add_argument("--sources", type=int, default=1)
+    parser.add_argument("--block-rows", type=int, default=64)
+    parser.add_argument("--refresh-interval", type=int, default=100, help="Refresh interval in milliseconds.")
+    parser.add_argument("--ticks", type=int, default=20, help="Ticks per trial.")
+    parser.add_argument("--steps", type=int, default=6, help="Bisection steps after first failing rate.")
+    args = parser.parse_args()
+
+    config = PlotConfig(
+        figsize=(1600, 900),
+        dpi=100,
+        npoints=args.npoints,
+        scale=(0.0, 1.0),
+        refresh_interval=args.refresh_interval,
+        address="localhost:0",
+        authkey="",
+        axes=[f"ch{index}" for index in range(args.channels)],
+        window_title="Plotter benchmark",
+    )
+    queue = SimpleQueue()
+    plotter = Plotter(config, queue)
+    plotter.plotter_window.timer.stop()
+    plotter.plotter_window.show()
+
+    rng = np.random.default_rng(0)
+    items = [
+        PlotBlock(f"source-{source}", None, rng.random((args.block_rows, args.channels))).encode()
+        for source in range(args.sources)
+    ]
+    interval = args.refresh_interval / 1e3
+
+    def passes(blocks_per_tick:int) -> bool:
+        tick_time, frame_time = run_trial(plotter, queue, items, blocks_per_tick, args.ticks)
+        rate = blocks_per_tick * args.block_rows * args.sources / interval
+        ok = tick_time.percentile(99) <= interval
+        print(
+            f"{rate:12.0f} rows/s | update_plot p50 {frame_time.percentile(50) * 1e3:7.2f} ms "
+            f"p99 {frame_time.percentile(99) * 1e3:7.2f} ms | tick p50 {tick_time.percentile(50) * 1e3:7.2f} ms "
+            f"p99 {tick_time.percentile(99) * 1e3:7.2f} ms | {'ok' if ok else 'too slow'}"
+        )
+        return ok
+
+    # Warm up plot creation for all sources.
+    run_trial(plotter, queue, items, 1, 2)
+
+    # Double blocks per tick until a tick no longer fits into the refresh interval, then bisect.
+    low, high = 0, 1
+    while passes(high):
+        low, high = high, high * 2
+    for _ in range(args.steps):
+        if high - low <= 1:
+            break
+        middle = (low + high) // 2
+        if passes(middle):
+            low = middle
+        else:
+            high = middle
+
+    max_rate = low * args.block_rows * args.sources / interval
+    print(
+        f"Max sustainable ingest rate: {max_rate:.0f} rows/s "
+        f"(npoints={args.npoints}, channels={args.channels}, sources={args.sources}, "
+        f"refresh={args.refresh_interval} ms)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Accuracy and speed of float32 filtering compared to float64.
+
+Runs the same simulated strokes through RollingAverage + VelocityEstimator in both precisions and reports
+maximum and RMS velocity difference, together with step time of the client pipeline and of
+VelocityEstimatorBank for many clients.
+
+    python -m benchmarks.precision --seconds 600 --tolerance 1e-3
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.long_session import simulate
+from common.math import PRECISIONS, RollingAverage, VelocityEstimator, VelocityEstimatorBank
+
+
+def run_pipeline(acceleration:np.ndarray, dt:float, dtype) -> "tuple[np.ndarray, float]":
+    """
+    Returns (samples, 3) velocities as float64 and mean step time.
+    """
+    rolling_average = RollingAverage(5, dtype=dtype)
+    estimator = VelocityEstimator(dt=dt, inactivity_threshold=0.4, inactivity_time_threshold=dt, dtype=dtype)
+    # Sensor readings arrive as Python floats.
+    samples = acceleration.tolist()
+    velocity = np.empty((len(samples), 3))
+
+    start_time = time.perf_counter()
+    for index, sample in enumerate(samples):
+        velocity[index] = estimator.apply(rolling_average.apply(sample))
+    return velocity, (time.perf_counter() - start_time) / len(samples)
+
+
+def run_bank(clients:int, ticks:int, dt:float, dtype) -> float:
+    """
+    Returns mean time of one bank step updating all clients.
+    """
+    bank = VelocityEstimatorBank(dt=dt, capacity=clients, dtype=dtype)
+    slots = np.array([bank.add_client() for _ in range(clients)])
+    samples = np.random.default_rng(0).normal(0.0, 0.5, (ticks, clients, 3))
+
+    start_time = time.perf_counter()
+    for tick in range(ticks):
+        bank.apply(slots, samples[tick])
+    return (time.perf_counter() - start_time) / ticks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=600.0, help="Simulated trace length.")
+    parser.add_argument("--dt", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clients", type=int, default=100, help="Clients in bank benchmark.")
+    parser.add_argument("--ticks", type=int, default=2000, help="Ticks in bank benchmark.")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="Maximum velocity difference in m/s.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    acceleration, _ = simulate(rng, args.dt, int(args.seconds / args.dt), np.array([0.02, -0.02, 0.0]), 0.05)
+
+    velocities, step_times = {}, {}
+    for name, dtype in PRECISIONS.items():
+        velocities[name], step_times[name] = run_pipeline(acceleration, args.dt, dtype)
+        bank_time = run_bank(args.clients, args.ticks, args.dt, dtype)
+        print(
+            f"{name}: pipeline {step_times[name] * 1e6:6.1f} us/step | "
+            f"bank {bank_time * 1e6:7.1f} us/tick for {args.clients} clients"
+        )
+
+    error = np.abs(velocities["float32"] - velocities["float64"])
+    max_error = float(error.max())
+    rms_error = float(np.sqrt(np.mean(error ** 2)))
+    peak = float(np.abs(velocities["float64"]).max())
+    print(f"float32 velocity error: max {max_error:.3g} m/s, rms {rms_error:.3g} m/s (peak velocity {peak:.3g} m/s)")
+
+    ok = max_error <= args.tolerance
+    print(f"{'PASS' if ok else 'FAIL'} (tolerance {args.tolerance:g} m/s)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
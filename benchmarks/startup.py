@@ -0,0 +1,110 @@
+"""
+Startup time benchmark of the headless mouse server.
+
+Reports slowest imports of server/main.py (python -X importtime) and measures cold start,
+i.e. time from process spawn until server accepts connection and sends Hello.
+
+    python -m benchmarks.startup --runs 5 --budget 0.2
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).absolute().parent.parent
+SERVER_DIR = PROJECT_ROOT / "server"
+
+
+def server_env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")]))
+    return env
+
+
+def import_times(top:int):
+    """
+    Returns total import time and `top` slowest top-level imports of server main module in microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SERVER_DIR, env=server_env(), capture_output=True, text=True, check=True,
+    )
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting level is encoded as indentation of the module name.
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, int(cumulative), name.strip()))
+
+    total = sum(cumulative for depth, cumulative, _ in entries if depth == 0)
+    nested = sorted((entry for entry in entries if entry[0] <= 1), key=lambda entry: -entry[1])
+    return total, nested[:top]
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def cold_start(config_path:Path, port:int, timeout:float=10.0) -> float:
+    """
+    Spawn headless server and poll until it accepts connection and sends Hello. Returns elapsed seconds.
+    """
+    start_time = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "main.py", "--config", str(config_path)],
+        cwd=SERVER_DIR, env=server_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start_time < timeout:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=timeout) as connection:
+                    connection.recv(1024)
+                    return time.perf_counter() - start_time
+            except ConnectionRefusedError:
+                time.sleep(0.001)
+        raise TimeoutError("Server did not start.")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to show.")
+    parser.add_argument("--budget", type=float, default=0.2, help="Cold start budget in seconds.")
+    args = parser.parse_args()
+
+    total, slowest = import_times(args.top)
+    print(f"server/main.py import time: {total / 1e3:.1f} ms")
+    for depth, cumulative, name in slowest:
+        print(f"  {cumulative / 1e3:8.1f} ms  {'  ' * depth}{name}")
+
+    port = free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = Path(directory) / "settings.json"
+        config = json.loads((SERVER_DIR / "config" / "settings.json").read_text())
+        config.update(address=f"127.0.0.1:{port}", plotter_address=None, plotter_authkey=None, metrics_address=None)
+        config_path.write_text(json.dumps(config))
+
+        times = [cold_start(config_path, port) for _ in range(args.runs)]
+
+    median = statistics.median(times)
+    print(f"headless server cold start: median {median * 1e3:.1f} ms, min {min(times) * 1e3:.1f} ms over {args.runs} runs")
+    print("PASS" if median <= args.budget else "FAIL")
+    return 0 if median <= args.budget else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+"""
+TCP loopback versus Unix domain socket transport to a local server.
+
+Starts the load test server with stub controller on each transport and measures, with the same Command
+framing, connect time including Hello, round trip of a single frame waiting for its ACK, and best of
+several throughput runs of frames sent in bursts with acknowledgements read by a separate thread.
+
+    python -m benchmarks.transport --frames 20000 --burst 32
+"""
+import argparse
+import json
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.startup import SERVER_DIR, free_port, server_env
+from common.command import ACK, Command, Hello, encode_frame
+from common.network_utils import configure_low_latency, create_connection, parse_address
+
+
+def start_server(address:str, directory:Path, server_args:"list | None" = None) -> subprocess.Popen:
+    config_path = directory / "settings.json"
+    config = json.loads((SERVER_DIR / "config" / "settings.json").read_text())
+    config.update(address=address, plotter_address=None, plotter_authkey=None, metrics_address=None)
+    config_path.write_text(json.dumps(config))
+    return subprocess.Popen(
+        [sys.executable, "load_test.py", "server", "--config", str(config_path), "--report-interval", "3600",
+         *(server_args or [])],
+        cwd=SERVER_DIR, env=server_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def connect(address:str, timeout:float=10.0) -> socket.socket:
+    connection = create_connection(parse_address(address), timeout=timeout)
+    configure_low_latency(connection)
+    Hello.recv(connection)
+    return connection
+
+
+def wait_for_server(address:str, timeout:float=10.0) -> socket.socket:
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            return connect(address)
+        except (ConnectionRefusedError, FileNotFoundError):
+            if time.perf_counter() > deadline:
+                raise TimeoutError("Server did not start.")
+            time.sleep(0.01)
+
+
+def connect_times(address:str, count:int) -> np.ndarray:
+    times = np.empty(count)
+    for index in range(count):
+        start_time = time.perf_counter()
+        connection = connect(address)
+        times[index] = time.perf_counter() - start_time
+        connection.close()
+    return times
+
+
+def round_trips(connection:socket.socket, frame:bytes, frames:int) -> np.ndarray:
+    latency = np.empty(frames)
+    for index in range(frames):
+        start_time = time.perf_counter()
+        connection.sendall(frame)
+        received = 0
+        while received < len(ACK):
+            received += len(connection.recv(64))
+        latency[index] = time.perf_counter() - start_time
+    return latency
+
+
+def throughput(connection:socket.socket, frame:bytes, frames:int, burst:int) -> float:
+    """
+    Returns acknowledged frames per second.
+    """
+    expected = frames // burst * burst
+
+    def read_acks():
+        received = 0
+        while received < expected * len(ACK):
+            received += len(connection.recv(65536))
+
+    reader = threading.Thread(target=read_acks)
+    start_time = time.perf_counter()
+    reader.start()
+    payload = frame * burst
+    for _ in range(frames // burst):
+        connection.sendall(payload)
+    reader.join()
+    return expected / (time.perf_counter() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--burst", type=int, default=32, help="Frames per write in throughput test.")
+    parser.add_argument("--connects", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3, help="Throughput runs, best is reported.")
+    args = parser.parse_args()
+
+    frame = encode_frame(Command(move=[120, -35, 0], scale=1000.0, timestamp=time.perf_counter()))
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        transports = {"tcp": f"127.0.0.1:{free_port()}"}
+        if hasattr(socket, "AF_UNIX"):
+            transports["unix"] = f"unix:{directory / 'server.sock'}"
+
+        print(f"{'transport':>9} {'connect us':>11} {'rtt p50 us':>11} {'rtt p99 us':>11} {'frames/s':>10}")
+        for name, address in transports.items():
+            server = start_server(address, directory)
+            try:
+                wait_for_server(address).close()
+                connect_time = np.median(connect_times(address, args.connects))
+                with connect(address) as connection:
+                    round_trips(connection, frame, min(1000, args.frames))
+                    latency = np.percentile(round_trips(connection, frame, args.frames), [50, 99])
+                    rate = max(throughput(connection, frame, args.frames, args.burst) for _ in range(args.repeat))
+            finally:
+                server.terminate()
+                server.wait()
+
+            print(
+                f"{name:>9} {connect_time * 1e6:>11.0f} {latency[0] * 1e6:>11.1f} "
+                f"{latency[1] * 1e6:>11.1f} {rate:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
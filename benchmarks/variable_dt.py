@@ -0,0 +1,112 @@
+"""
+Fixed versus measured sample interval in VelocityEstimator.
+
+Samples planar strokes (one sine period of acceleration) at jittered times, with runs of samples dropped
+like on reader queue overflow, and integrates them with the nominal interval and with measured intervals.
+Reports velocity error against the exact stroke velocity, stroke displacement error, and best of several
+step time measurements of both paths on regular and irregular timing.
+
+    python -m benchmarks.variable_dt --jitter 0.3 --drop-rate 0.02
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common.math import VelocityEstimator
+
+
+def sample_times(rng:np.random.Generator, args) -> np.ndarray:
+    intervals = args.dt * (1.0 + rng.uniform(-args.jitter, args.jitter, int(args.seconds / args.dt)))
+    # Dropped samples leave a gap of several intervals.
+    drops = rng.random(len(intervals)) < args.drop_rate
+    intervals[drops] *= rng.integers(2, args.max_drop + 2, drops.sum())
+    return np.cumsum(intervals)
+
+
+def strokes(rng:np.random.Generator, t:np.ndarray, noise:float):
+    """
+    Returns (samples, 3) measured acceleration, exact x velocity and list of (first, last, displacement)
+    sample ranges of strokes.
+    """
+    acceleration = rng.normal(0.0, noise, (len(t), 3))
+    velocity = np.zeros(len(t))
+    ranges = []
+
+    start = rng.uniform(0.5, 1.5)
+    while start < t[-1] - 2.0:
+        period = rng.uniform(0.2, 0.6)
+        amplitude = rng.uniform(1.0, 3.0) * rng.choice([-1.0, 1.0])
+        inside = (t >= start) & (t < start + period)
+        phase = 2.0 * np.pi * (t[inside] - start) / period
+        acceleration[inside, 0] += amplitude * np.sin(phase)
+        velocity[inside] = amplitude * period / (2.0 * np.pi) * (1.0 - np.cos(phase))
+
+        indices = np.flatnonzero(inside)
+        if len(indices):
+            ranges.append((indices[0], indices[-1] + 1, amplitude * period ** 2 / (2.0 * np.pi)))
+        start += period + rng.uniform(1.0, 2.0)
+
+    return acceleration, velocity, ranges
+
+
+def run(dt:float, samples:list, intervals:"list | None", repeat:int) -> "tuple[np.ndarray, float]":
+    """
+    Returns x velocity estimates and best mean step time of `repeat` runs.
+    """
+    velocity = np.empty(len(samples))
+    step_time = float("inf")
+    for _ in range(repeat):
+        estimator = VelocityEstimator(dt=dt)
+        start_time = time.perf_counter()
+        if intervals is None:
+            for index, sample in enumerate(samples):
+                velocity[index] = estimator.apply(sample)[0]
+        else:
+            for index, (sample, interval) in enumerate(zip(samples, intervals)):
+                velocity[index] = estimator.apply(sample, interval)[0]
+        step_time = min(step_time, (time.perf_counter() - start_time) / len(samples))
+    return velocity, step_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=300.0)
+    parser.add_argument("--dt", type=float, default=0.01, help="Nominal sampling interval.")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Relative interval jitter.")
+    parser.add_argument("--drop-rate", type=float, default=0.02, help="Probability of a gap of dropped samples.")
+    parser.add_argument("--max-drop", type=int, default=5, help="Maximum samples dropped at once.")
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    t = sample_times(rng, args)
+    acceleration, exact, ranges = strokes(rng, t, args.noise)
+    intervals = np.diff(t, prepend=t[0] - args.dt)
+    samples = acceleration.tolist()
+
+    estimates = {
+        "fixed": run(args.dt, samples, None, args.repeat),
+        "measured": run(args.dt, samples, intervals.tolist(), args.repeat),
+    }
+    regular = run(args.dt, samples, [args.dt] * len(samples), args.repeat)
+
+    print(f"{len(samples)} samples, interval mean {intervals.mean() * 1e3:.2f} ms, max {intervals.max() * 1e3:.1f} ms")
+    print(f"{'dt':>9} {'step us':>8} {'vel rms m/s':>12} {'vel max m/s':>12} {'disp err %':>11}")
+    for name, (velocity, step_time) in estimates.items():
+        error = velocity - exact
+        displacement_error = [
+            abs(np.sum(velocity[first:last] * intervals[first:last]) - displacement) / abs(displacement)
+            for first, last, displacement in ranges
+        ]
+        print(
+            f"{name:>9} {step_time * 1e6:>8.1f} {np.sqrt(np.mean(error ** 2)):>12.4f} {np.abs(error).max():>12.4f} "
+            f"{np.mean(displacement_error) * 100:>11.1f}"
+        )
+    print(f"measured dt on regular timing: {regular[1] * 1e6:.1f} us/step")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Aggregate server throughput versus number of worker processes.
+
+Starts the load test server with stub injection and 1, 2, ... worker processes, then drives it from client
+processes, each sending frames over its own connection in bursts and counting acknowledgements for a fixed
+time. Reports acknowledged frames per second summed over clients. Raw acceleration frames are sent by default,
+so that the server filters every frame; --moves sends precomputed moves instead.
+Clients run on the same host, so scaling is bounded by cores left to the server.
+
+    python -m benchmarks.workers --workers 1,2,4 --clients 8 --duration 5
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.startup import free_port
+from benchmarks.transport import connect, start_server, wait_for_server
+from common.command import ACK, Command, encode_frame
+
+
+def client(address:str, frame:bytes, burst:int, duration:float, start_time:float) -> int:
+    """
+    Returns frames acknowledged within `duration` seconds from `start_time`.
+    """
+    connection = connect(address)
+    connection.settimeout(0.1)
+    time.sleep(max(0.0, start_time - time.time()))
+    deadline = time.perf_counter() + duration
+    acknowledged = [0]
+    # Bursts sent ahead of their acknowledgements.
+    window = threading.Semaphore(4)
+
+    def read_acks():
+        received = 0
+        while time.perf_counter() < deadline:
+            try:
+                data = connection.recv(65536)
+            except TimeoutError:
+                continue
+            if not data:
+                return
+            received += len(data)
+            bursts, received = divmod(received, burst * len(ACK))
+            acknowledged[0] += bursts * burst
+            for _ in range(bursts):
+                window.release()
+
+    reader = threading.Thread(target=read_acks, daemon=True)
+    reader.start()
+    payload = frame * burst
+    while time.perf_counter() < deadline:
+        if window.acquire(timeout=0.1):
+            connection.sendall(payload)
+    reader.join()
+    connection.close()
+    return acknowledged[0]
+
+
+def run(address:str, frame:bytes, args) -> float:
+    """
+    Returns acknowledged frames per second of all clients together.
+    """
+    start_time = time.time() + 0.5
+    with multiprocessing.Pool(args.clients) as pool:
+        counts = pool.starmap(client, [(address, frame, args.burst, args.duration, start_time)] * args.clients)
+    return sum(counts) / args.duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated worker counts.")
+    parser.add_argument("--clients", type=int, default=8, help="Client processes, one connection each.")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--burst", type=int, default=16, help="Frames per write.")
+    parser.add_argument("--moves", action="store_true", help="Send moves instead of raw acceleration.")
+    args = parser.parse_args()
+
+    if args.moves:
+        frame = encode_frame(Command(move=[120, -35, 0], scale=1000.0, timestamp=time.perf_counter()))
+    else:
+        frame = encode_frame(Command(acceleration=[0.3, -0.2, 0.05], timestamp=time.perf_counter()))
+
+    print(f"{os.cpu_count()} cores, {args.clients} clients")
+    print(f"{'workers':>7} {'frames/s':>10} {'speedup':>8}")
+    baseline = None
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in [int(value) for value in args.workers.split(",")]:
+            address = f"127.0.0.1:{free_port()}"
+            server = start_server(address, Path(directory), ["--workers", str(workers)])
+            try:
+                wait_for_server(address).close()
+                rate = run(address, frame, args)
+            finally:
+                server.terminate()
+                server.wait()
+
+            baseline = baseline or rate
+            print(f"{workers:>7} {rate:>10.0f} {rate / baseline:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,9 @@ from pathlib import Path
 project_root_path = str(Path(__file__).absolute().parent.parent)
 sys.path.append(project_root_path)
 
-import socket
 import threading
 import time
-from typing import Callable
+from typing import Callable, Optional
 
 import numpy as np
 from kivy.app import App
@@ -23,17 +22,25 @@ from kivy.utils import platform
 from numpy.typing import NDArray
 from typing import Deque
 
-from common.command import Command
-from common.math import RollingAverage, trapezoidal_interpolation, VelocityEstimator
-from sensors import Accelerometer, SensorReading, DummySensor
+import common.logger_config as logger_config
+from common.command import ClickEvent, Command, MoveEncoder, PlotFrame, encode_frame
+from common.profiler import StageProfiler
+from common.network_utils import parse_address
+from common.math import Constants, OrientationFilter, PRECISIONS, RollingAverage, trapezoidal_interpolation, VelocityEstimator
+from sensors import Accelerometer, Gyroscope, SensorReading, DummySensor
+from sender import FramePriority, SenderThread
 from collections import deque
 from enum import Enum
 
+# Records logged on every processing step, rate limited so that the console keeps up with the sampling rate.
+step_logger = logger_config.ThrottledLogger(Logger.getChild("processor"), logger_config.Throttle(rate=15.0))
 
 if platform == "win":
     accelerometer = DummySensor()
+    gyroscope = None
 else:
     accelerometer = Accelerometer()
+    gyroscope = Gyroscope()
 
 
 def get_vec_info_str(header: str, vec: NDArray) -> str:
@@ -46,14 +53,26 @@ class MouseState(Enum):
 
 
 class SensorReaderThread(threading.Thread):
-    
-    def __init__(self, interval=1.0/60.0):
+    """
+    Reads samples into a preallocated ring, queued readings are views of its rows.
+    With gyroscope enabled accelerometer samples are left uncorrected, orientation filter needs gravity in them.
+    """
+    # Ring rows beyond queue capacity. Reading taken from the queue stays valid until this many newer samples are read.
+    RING_SLACK = 64
+
+    def __init__(self, interval=1.0/60.0, read_gyro=False):
         super().__init__()
         self.queue_size = 1000
         self.interval = interval
+        self.read_gyro = read_gyro and gyroscope is not None
         self.queue:Deque[SensorReading] = deque(maxlen=self.queue_size)
         self.stop_signal = threading.Event()
 
+        ring_size = self.queue_size + self.RING_SLACK
+        self.acc_ring = np.empty((ring_size, 3))
+        self.gyro_ring = np.empty((ring_size, 3)) if self.read_gyro else None
+        self.ring_index = 0
+
     def stop(self):
         """Signals the thread to stop collecting sensor data."""
         self.stop_signal.set()
@@ -63,7 +82,14 @@ class SensorReaderThread(threading.Thread):
         while not self.stop_signal.is_set():
             start_time = time.perf_counter()
 
-            reading = accelerometer.read()
+            index = self.ring_index
+            self.ring_index = (index + 1) % len(self.acc_ring)
+            timestamp = accelerometer.read_into(self.acc_ring, index, correct=not self.read_gyro)
+            gyro = None
+            if self.read_gyro:
+                gyroscope.read_into(self.gyro_ring, index)
+                gyro = self.gyro_ring[index]
+            reading = SensorReading(timestamp=timestamp, data=self.acc_ring[index], gyro=gyro)
 
             if len(self.queue) == self.queue_size:
                 Logger.warning("Accelerometer queue full. Dropping oldest samples.")
@@ -96,9 +122,15 @@ class MouseProcessorThread(threading.Thread):
         self.set_info_text = set_info_text_func
 
         sampling_interval = float(self.config.get("general", "sampling_interval"))
-        self.sensor_reader_thread = SensorReaderThread(sampling_interval)
+        self.fusion_enabled = bool(int(self.config.get("general", "fusion"))) and gyroscope is not None
+        self.sensor_reader_thread = SensorReaderThread(sampling_interval, read_gyro=self.fusion_enabled)
+        self.sender_thread = SenderThread(
+            parse_address(self.config.get("general", "server_address")),
+            queue_size=int(self.config.get("general", "send_queue_size")),
+            profiling=bool(int(self.config.get("general", "profiling"))),
+        )
 
-        self.mouse_click = [False, False]
+        self.settings_changed = threading.Event()
 
 
     def stop_thread(self):
@@ -109,51 +141,99 @@ class MouseProcessorThread(threading.Thread):
         self.thread_running.clear()
         self.sensor_reader_thread.stop()
         self.sensor_reader_thread.join()
+        self.sender_thread.stop()
+        if self.sender_thread.is_alive():
+            self.sender_thread.join()
 
     def run(self):
         """
         Initialize variables and run processing loop until thread stopped.
         """
         Logger.info("Running processor thread.")
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as connection:
-            address, port = self.config.get("general", "server_address").split(":")
-            connection.connect((address, int(port)))
-
-            self.threshold = np.array([
-                float(self.config.get("general", "acc_threshold_x")),
-                float(self.config.get("general", "acc_threshold_y")),
-                0.0
-            ])
-            self.moving_threshold_gain = float(self.config.get("general", "moving_threshold_gain"))
-            self.mouse_speed = float(self.config.get("general", "mouse_speed"))
-            self.inactive_time = float(self.config.get("general", "inactive_time"))
-
-            self.sensor_reader_thread.start()
-            self.running_average_window = int(self.config.get("general", "running_average_window"))
-            self.running_average_filter = RollingAverage(self.running_average_window)
-            self.kalman_filter = VelocityEstimator(
-                dt=self.sensor_reader_thread.interval,
-                inactivity_time_threshold=self.inactive_time,
-                inactivity_threshold=self.threshold[0]
-            )
-            self.reset_mouse_state()
-
-            Logger.info("Mouse_speed: %s", str(self.mouse_speed))
+        self.last_send_time = 0.0
+        self.last_plot_time = 0.0
+        self.last_profile_report_time = time.perf_counter()
+        self.profile_summary_text = ""
+        self.last_reading_time = None
+
+        self.profiler = StageProfiler(["wait", "filter", "format", "enqueue"])
+        self.move_encoder = MoveEncoder()
+        dtype = PRECISIONS[self.config.get("general", "precision")]
+        self.running_average_filter = RollingAverage(int(self.config.get("general", "running_average_window")), dtype=dtype)
+        self.kalman_filter = VelocityEstimator(dt=self.sensor_reader_thread.interval, dtype=dtype)
+        # Fusion gets uncorrected samples with gains applied, so gravity is what the sensor reads at rest.
+        self.orientation_filter = OrientationFilter(
+            gravity=accelerometer.rest_magnitude() or Constants.EARTH_ACC[2], dtype=dtype
+        )
+        self.fusion_input = np.zeros(3)
+        self.load_settings()
+        if self.fusion_enabled:
+            gyroscope.enable()
+        self.reset_mouse_state()
+
+        Logger.info("Mouse_speed: %s", str(self.mouse_speed))
+
+        self.thread_running.set()
+        self.sensor_reader_thread.start()
+        self.sender_thread.start()
+
+        while self.thread_running.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                Logger.exception("Error in MouseProcessorThread step function.")
+                self.stop_thread()
+
+        if self.fusion_enabled:
+            gyroscope.disable()
+        accelerometer.disable()
+
+    def load_settings(self):
+        """
+        Read settings which can be changed while running and apply them to existing filters,
+        so that filter state and server connection are kept.
+        """
+        self.threshold = np.array([
+            float(self.config.get("general", "acc_threshold_x")),
+            float(self.config.get("general", "acc_threshold_y")),
+            0.0
+        ])
+        self.moving_threshold_gain = float(self.config.get("general", "moving_threshold_gain"))
+        self.mouse_speed = float(self.config.get("general", "mouse_speed"))
+        self.inactive_time = float(self.config.get("general", "inactive_time"))
+        self.idle_deadband = float(self.config.get("general", "idle_deadband"))
+        self.heartbeat_interval = float(self.config.get("general", "heartbeat_interval"))
+        move_scale = float(self.config.get("general", "move_scale"))
+        if move_scale != self.move_encoder.scale:
+            # Residual is in units of the previous scale.
+            self.move_encoder.scale = move_scale
+            self.move_encoder.reset()
+        self.plot_rate = float(self.config.get("general", "plot_rate"))
+        self.server_filtering = bool(int(self.config.get("general", "server_filtering")))
+
+        self.profiler.enabled = bool(int(self.config.get("general", "profiling")))
+        self.sender_thread.profiler.enabled = self.profiler.enabled
+        self.profile_report_interval = float(self.config.get("general", "profile_report_interval"))
+        self.send_telemetry = bool(int(self.config.get("general", "send_telemetry")))
+
+        self.running_average_filter.resize(int(self.config.get("general", "running_average_window")))
+        self.kalman_filter.inactivity_threshold = self.threshold[0]
+        self.kalman_filter.inactivity_time_threshold = self.inactive_time
+        self.kalman_filter.set_noise(
+            float(self.config.get("general", "process_noise_var")),
+            float(self.config.get("general", "measurement_noise_var")),
+        )
+        self.orientation_filter.kp = float(self.config.get("general", "fusion_gain"))
+        self.measured_dt = bool(int(self.config.get("general", "measured_dt")))
 
-            self.thread_running.set()
-            while self.thread_running.is_set():
-                try:
-                    self.step(connection)
-                except Exception as e:
-                    Logger.exception("Error in MouseProcessorThread step function.")
-                    self.stop_thread()
-            
-            accelerometer.disable()
+    def update_settings(self):
+        """
+        Request settings reload. Settings are applied by the processing thread between steps.
+        """
+        self.settings_changed.set()
 
     def reset_mouse_state(self):
-        Logger.info(
-            f"Reseting mouse speed, device at rest for more than {self.inactive_time}s."
-        )
+        Logger.info("Reseting mouse speed, device at rest for more than %ss.", self.inactive_time)
         self.state = MouseState.REST
         self.prev_time = time.perf_counter()
         self.speed = np.zeros(3)
@@ -163,20 +243,48 @@ class MouseProcessorThread(threading.Thread):
         self.running_average_filter.reset()
         self.movement_time = 0.0
 
-    def step(self, connection):
+    def step(self):
         """
-        Compute control signal and send mouse command to the server.
+        Compute control signal and queue mouse command for the sender thread.
         """
-        Logger.info(f"Sensor readings queue size: {len(self.sensor_reader_thread.queue)}")
+        if self.settings_changed.is_set():
+            self.settings_changed.clear()
+            self.load_settings()
+            Logger.info("Settings updated, mouse_speed: %s.", self.mouse_speed)
+
+        self.profiler.begin()
+        step_logger.info("Sensor readings queue size: %d", len(self.sensor_reader_thread.queue))
 
         while len(self.sensor_reader_thread.queue) == 0:
+            if not self.thread_running.is_set():
+                return
             time.sleep(self.sensor_reader_thread.interval)
 
         reading = self.sensor_reader_thread.queue.popleft()
-        Logger.info("reading.data {}".format(reading.data))
+        step_logger.info("reading.data %s", reading.data)
+        self.profiler.mark("wait")
+
+        acceleration = reading.data
+        if self.fusion_enabled and reading.gyro is not None:
+            # Reading still holds gravity and sensor offset, only gains are applied. Offset measured at rest
+            # is mostly gravity, subtracting it would leave the filter without gravity direction.
+            np.multiply(reading.data, accelerometer.inv_gains, out=self.fusion_input)
+            acceleration = self.orientation_filter.update(
+                reading.gyro, self.fusion_input, self.sensor_reader_thread.interval
+            )
 
-        speed = self.running_average_filter.apply(reading.data)
-        speed = self.kalman_filter.apply(speed)
+        if self.server_filtering:
+            # Velocity is estimated by the server, only raw acceleration is sent.
+            speed = np.zeros(3)
+        else:
+            speed = self.running_average_filter.apply(acceleration)
+            # Sampling jitters and samples are dropped when reader queue overflows, so real interval is integrated.
+            dt = None
+            if self.measured_dt and self.last_reading_time is not None:
+                dt = reading.timestamp - self.last_reading_time
+            speed = self.kalman_filter.apply(speed, dt)
+        self.last_reading_time = reading.timestamp
+        self.profiler.mark("filter")
 
         info_text_lines = [
             ("Raw Accelerometer", reading.data),
@@ -186,30 +294,104 @@ class MouseProcessorThread(threading.Thread):
         info_text_str = os.linesep.join(
             [get_vec_info_str(*entry) for entry in info_text_lines]
         )
-        Logger.info(info_text_str)
+        if self.profile_summary_text:
+            info_text_str += os.linesep + self.profile_summary_text
+        step_logger.info("%s", info_text_str)
 
         if self.set_info_text:
             Clock.schedule_once(lambda dt: self.set_info_text(info_text_str), 0)
 
-        cmd = Command(
-            move=speed.tolist(),
-            click=self.mouse_click,
-            plot_data=[
-                *reading.data,
-                *speed,
-            ]
-        )
-        self.mouse_click = [False, False]
+        if self.server_filtering:
+            cmd = Command(
+                acceleration=[float(value) for value in acceleration],
+                speed=self.mouse_speed,
+                telemetry=self.take_profile_report(),
+                timestamp=reading.timestamp,
+            )
+        elif self.should_send(speed):
+            cmd = Command(
+                move=self.move_encoder.encode((speed * self.mouse_speed).tolist()),
+                scale=self.move_encoder.scale,
+                telemetry=self.take_profile_report(),
+                timestamp=reading.timestamp,
+            )
+        else:
+            return
+        self.profiler.mark("format")
 
-        cmd.send(connection)
-        cmd.wait_for_ack(connection)
+        self.sender_thread.send(encode_frame(cmd), FramePriority.CONTROL)
+        self.send_plot_data([*reading.data, *speed])
+        self.profiler.mark("enqueue")
+        self.last_send_time = time.perf_counter()
+
+    def send_button(self, button:int, pressed:bool):
+        """
+        Queue button edge for sending right away. Called from UI thread, does not wait for the sampling loop.
+        """
+        event = ClickEvent(button=button, pressed=pressed, timestamp=time.perf_counter())
+        self.sender_thread.send(encode_frame(event), FramePriority.CLICK)
+
+    def send_plot_data(self, row:"list"):
+        """
+        Send plot row at most plot_rate times per second, only if server has a plotter connected.
+        """
+        if not self.sender_thread.plotter_enabled or self.plot_rate <= 0:
+            return
+
+        now = time.perf_counter()
+        if now - self.last_plot_time < 1.0 / self.plot_rate:
+            return
+        self.last_plot_time = now
+
+        frame = PlotFrame(rows=[[float(value) for value in row]])
+        self.sender_thread.send(encode_frame(frame), FramePriority.TELEMETRY)
+
+    def take_profile_report(self) -> "Optional[dict]":
+        """
+        Every profile_report_interval seconds log sender stats and stage timings summary, then reset them.
+        Returns report if it should be sent to the server as telemetry.
+        """
+        now = time.perf_counter()
+        if now - self.last_profile_report_time < self.profile_report_interval:
+            return None
+        self.last_profile_report_time = now
+
+        report = {"sender": self.sender_thread.take_stats()}
+        lines = [f"sender: {report['sender']}"]
+
+        if self.profiler.enabled:
+            report.update(self.profiler.summary())
+            report.update(self.sender_thread.profiler.summary())
+            lines.append(self.profiler.format_summary())
+            lines.append(self.sender_thread.profiler.format_summary())
+            self.profiler.reset()
+            self.sender_thread.profiler.reset()
+
+        self.profile_summary_text = os.linesep.join(lines)
+        Logger.info("Step profile:%s%s", os.linesep, self.profile_summary_text)
+
+        return report if self.send_telemetry else None
+
+    def should_send(self, speed:NDArray) -> bool:
+        """
+        Suppress commands while device is at rest, except for periodic heartbeat.
+        """
+        if np.linalg.norm(speed[:2]) >= self.idle_deadband:
+            return True
+        return time.perf_counter() - self.last_send_time >= self.heartbeat_interval
 
 
 class MouseClientApp(App):
     """
     Mouse Client App With Kivy Framework.
     """
+    # Settings which require new sensor reader or server connection, other settings are applied while running.
+    RESTART_SETTINGS = {"server_address", "sampling_interval", "send_queue_size", "fusion", "precision"}
+
     def build(self):
+        # Console and file output of Kivy logger runs on a listener thread instead of processing and UI threads.
+        logger_config.skip_record_details()
+        logger_config.make_async(Logger)
         self.main_layout = BoxLayout(orientation="vertical")
         self.build_mouse_buttons_layout()
         self.build_info_layout()
@@ -218,12 +400,20 @@ class MouseClientApp(App):
         return self.main_layout
 
     def on_lmb_press(self, instance):
-        if self.processor and self.processor.mouse_click:
-            self.processor.mouse_click[0] = True
+        if self.processor:
+            self.processor.send_button(0, True)
+
+    def on_lmb_release(self, instance):
+        if self.processor:
+            self.processor.send_button(0, False)
 
     def on_rmb_press(self, instance):
-        if self.processor and self.processor.mouse_click:
-            self.processor.mouse_click[1] = True
+        if self.processor:
+            self.processor.send_button(1, True)
+
+    def on_rmb_release(self, instance):
+        if self.processor:
+            self.processor.send_button(1, False)
 
     def build_mouse_buttons_layout(self):
         self.top_container = AnchorLayout(
@@ -234,10 +424,10 @@ class MouseClientApp(App):
         )  # Occupies less space for more realistic spacing
 
         self.left_button = Button(text="Left Click", size_hint=(0.45, 1))
-        self.left_button.bind(on_press = self.on_lmb_press)
+        self.left_button.bind(on_press = self.on_lmb_press, on_release = self.on_lmb_release)
 
         self.right_button = Button(text="Right Click", size_hint=(0.45, 1))
-        self.right_button.bind(on_press = self.on_rmb_press)
+        self.right_button.bind(on_press = self.on_rmb_press, on_release = self.on_rmb_release)
 
         self.scroll_area = Button(
             text="Scroll", size_hint=(0.1, 1.0)
@@ -272,6 +462,7 @@ class MouseClientApp(App):
     def on_start(self):
         Logger.info("on_start()")
         self.processor = None
+        self.changed_settings = set()
         self.open_settings()
 
     def close_settings(self, *args, **kwargs):
@@ -281,6 +472,12 @@ class MouseClientApp(App):
         def set_info_label_text(info):
             self.label.text = info
 
+        changed_settings, self.changed_settings = self.changed_settings, set()
+        if self.processor and self.processor.is_alive() and not changed_settings & self.RESTART_SETTINGS:
+            if changed_settings:
+                self.processor.update_settings()
+            return
+
         self.on_stop()
 
         self.processor = MouseProcessorThread(self.config, set_info_label_text)
@@ -291,7 +488,7 @@ class MouseClientApp(App):
         config.setdefaults(
             "general",
             {
-                "mouse_speed": 5.0,
+                "mouse_speed": 1.0,
                 "gyro_lp_alpha": np.pi / 90.0,
                 "acc_lp_alpha": 0.1,
                 "acc_threshold_x": 0.4,
@@ -300,6 +497,21 @@ class MouseClientApp(App):
                 "inactive_time": 0.01,
                 "sampling_interval": 1.0 / 100.0,
                 "running_average_window": 5,
+                "process_noise_var": 0.02,
+                "measurement_noise_var": 0.01,
+                "precision": "float64",
+                "measured_dt": 1,
+                "idle_deadband": 0.001,
+                "heartbeat_interval": 1.0,
+                "move_scale": 1000.0,
+                "send_queue_size": 8,
+                "plot_rate": 20.0,
+                "server_filtering": 0,
+                "fusion": 0,
+                "fusion_gain": 1.0,
+                "profiling": 0,
+                "profile_report_interval": 10.0,
+                "send_telemetry": 0,
                 "server_address": "192.168.8.24:5000",
             },
         )
@@ -309,7 +521,8 @@ class MouseClientApp(App):
             settings.add_json_panel("Settings", self.config, data=settings_json.read())
 
     def on_config_change(self, config, section, key, value):
-        Logger.info(f"Config changed: {section}, {key}, {value}")
+        Logger.info("Config changed: %s, %s, %s", section, key, value)
+        self.changed_settings.add(key)
 
     def on_stop(self):
         Logger.info("on_stop()")
@@ -0,0 +1,292 @@
+import socket
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Deque, Optional, Set, Tuple
+
+from kivy.logger import Logger
+
+from common.command import Command, Hello, decode_message
+from common.network_utils import configure_low_latency, create_connection
+from common.profiler import Histogram, StageProfiler
+
+
+class FramePriority(IntEnum):
+    TELEMETRY = 0
+    CONTROL = 1
+    CLICK = 2
+
+
+class FrameQueue:
+    """
+    Bounded, latest-wins queue of encoded frames, each stored with priority and time it was queued.
+    When full, the oldest frame of the lowest priority is dropped, or the incoming frame if its priority is lower
+    than all queued ones. Click frames are taken out ahead of all other frames and never dropped to make room,
+    they are bounded by MAX_CLICKS and MAX_CLICK_AGE instead.
+    """
+    # Clicks queued longer, e.g. while server is unreachable, are dropped rather than injected late
+    # at wherever the cursor is by then.
+    MAX_CLICK_AGE = 1.0
+    MAX_CLICKS = 16
+
+    def __init__(self, maxlen:int=8):
+        self.maxlen = maxlen
+        self.frames:Deque[Tuple[bytes, FramePriority, float]] = deque()
+        self.condition = threading.Condition()
+        self.clicks = 0
+        self.dropped = 0
+        self.max_depth = 0
+        # Buttons whose press was sent and release was not.
+        self.pressed:Set[int] = set()
+
+    def put(self, frame:bytes, priority:FramePriority=FramePriority.CONTROL):
+        with self.condition:
+            if len(self.frames) >= self.maxlen:
+                lowest = min(item[1] for item in self.frames)
+                if priority < lowest:
+                    # Incoming frame is the least important one, queued frames are kept.
+                    self.dropped += 1
+                    return
+                if lowest < FramePriority.CLICK:
+                    for index, item in enumerate(self.frames):
+                        if item[1] == lowest:
+                            del self.frames[index]
+                            self.dropped += 1
+                            break
+
+            self.frames.append((frame, priority, time.perf_counter()))
+            if priority == FramePriority.CLICK:
+                self.clicks += 1
+                if self.clicks > self.MAX_CLICKS:
+                    self.expire_clicks()
+            self.max_depth = max(self.max_depth, len(self.frames))
+            self.condition.notify()
+
+    def put_back(self, item:"Tuple[bytes, FramePriority, float]"):
+        """
+        Return item which could not be sent to the front of the queue, so that it keeps its order.
+        """
+        with self.condition:
+            self.frames.appendleft(item)
+            if item[1] == FramePriority.CLICK:
+                self.clicks += 1
+            self.condition.notify()
+
+    def get(self, timeout:float) -> "Optional[Tuple[bytes, FramePriority, float]]":
+        with self.condition:
+            if not self.frames:
+                self.condition.wait(timeout)
+            if not self.frames:
+                return None
+            if self.clicks:
+                self.expire_clicks()
+            if self.clicks:
+                for index, item in enumerate(self.frames):
+                    if item[1] == FramePriority.CLICK:
+                        del self.frames[index]
+                        self.clicks -= 1
+                        return item
+            return self.frames.popleft()
+
+    def mark_sent(self, item:"Tuple[bytes, FramePriority, float]"):
+        """
+        Record that item was delivered, tracks which buttons the server holds pressed.
+        """
+        if item[1] == FramePriority.CLICK:
+            event = decode_message(item[0])
+            with self.condition:
+                if event.pressed:
+                    self.pressed.add(event.button)
+                else:
+                    self.pressed.discard(event.button)
+
+    def expire_clicks(self):
+        """
+        Drop clicks older than MAX_CLICK_AGE and the oldest clicks beyond MAX_CLICKS. Release of a button whose
+        press was sent is always kept, release of a dropped press is dropped with it. Called with condition held.
+        """
+        now = time.perf_counter()
+        oldest = next(item[2] for item in self.frames if item[1] == FramePriority.CLICK)
+        excess = self.clicks - self.MAX_CLICKS
+        if excess <= 0 and now - oldest <= self.MAX_CLICK_AGE:
+            return
+
+        # Button state as the server will see it after the kept clicks.
+        pressed = set(self.pressed)
+        dropped_presses:Set[int] = set()
+        kept:Deque[Tuple[bytes, FramePriority, float]] = deque()
+        for item in self.frames:
+            if item[1] != FramePriority.CLICK:
+                kept.append(item)
+                continue
+
+            event = decode_message(item[0])
+            if event.pressed:
+                if excess > 0 or now - item[2] > self.MAX_CLICK_AGE:
+                    dropped_presses.add(event.button)
+                    excess -= 1
+                    continue
+                dropped_presses.discard(event.button)
+                pressed.add(event.button)
+            elif event.button not in pressed and event.button in dropped_presses:
+                dropped_presses.discard(event.button)
+                excess -= 1
+                continue
+            else:
+                pressed.discard(event.button)
+            kept.append(item)
+
+        dropped = len(self.frames) - len(kept)
+        if dropped:
+            self.frames = kept
+            self.clicks -= dropped
+            self.dropped += dropped
+            Logger.warning("Dropped %d stale or excess click events.", dropped)
+
+    def __len__(self):
+        return len(self.frames)
+
+
+class SenderThread(threading.Thread):
+    """
+    Owns server connection and sends encoded frames, so that filtering never blocks on the network.
+    Reconnects automatically with exponential backoff.
+    """
+    CONNECT_TIMEOUT = 2.0
+    RECONNECT_BACKOFF_MIN = 0.05
+    RECONNECT_BACKOFF_MAX = 2.0
+    STALL_THRESHOLD = 0.1
+
+    def __init__(self, address:"Tuple[str, int]", queue_size:int=8, profiling:bool=False):
+        super().__init__()
+        self.address = address
+        self.queue = FrameQueue(queue_size)
+        self.stop_signal = threading.Event()
+        self.profiler = StageProfiler(["send", "ack"], enabled=profiling)
+        # Time from click being queued until server acknowledged it.
+        self.click_latency = Histogram()
+        # Negotiated with the server on every connect.
+        self.plotter_enabled = False
+        # Current connection, shut down by stop() to interrupt a send or ACK wait blocked on a dead link.
+        self.connection:Optional[socket.socket] = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.frames_sent = 0
+        self.stalls = 0
+        self.max_send_time = 0.0
+        self.reconnects = 0
+        self.click_latency.reset()
+        self.queue.dropped = 0
+        self.queue.max_depth = len(self.queue)
+
+    def take_stats(self) -> dict:
+        """
+        Return send-side counters since previous call and reset them.
+        """
+        stats = {
+            "sent": self.frames_sent,
+            "dropped": self.queue.dropped,
+            "stalls": self.stalls,
+            "max_send_ms": int(self.max_send_time * 1e3),
+            "max_depth": self.queue.max_depth,
+            "reconnects": self.reconnects,
+            "clicks": self.click_latency.count,
+            "click_p50_ms": round(self.click_latency.percentile(50) * 1e3, 1),
+            "click_max_ms": round(self.click_latency.max * 1e3, 1),
+        }
+        self.reset_stats()
+        return stats
+
+    def send(self, frame:bytes, priority:FramePriority=FramePriority.CONTROL):
+        """
+        Queue frame for sending. Never blocks on the socket.
+        """
+        self.queue.put(frame, priority)
+
+    def stop(self):
+        self.stop_signal.set()
+        connection = self.connection
+        if connection:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def run(self):
+        Logger.info("Starting sender thread.")
+        connection = self.connect()
+        while connection and not self.stop_signal.is_set():
+            item = self.queue.get(timeout=0.1)
+            if item is None:
+                continue
+
+            frame, priority, queued_time = item
+            try:
+                self.send_frame(connection, frame)
+                self.queue.mark_sent(item)
+                if priority == FramePriority.CLICK:
+                    self.click_latency.record(time.perf_counter() - queued_time)
+            except OSError as e:
+                # Besides resets, a lost network raises plain OSError, e.g. EHOSTUNREACH or ENETDOWN.
+                if self.stop_signal.is_set():
+                    break
+                Logger.warning("Connection to server lost: %s", e)
+                if priority == FramePriority.CLICK:
+                    self.queue.put_back(item)
+                connection.close()
+                connection = self.reconnect()
+
+        if connection:
+            connection.close()
+        Logger.info("Sender thread stopped.")
+
+    def send_frame(self, connection:socket.socket, frame:bytes):
+        start_time = time.perf_counter()
+        self.profiler.begin()
+
+        connection.sendall(frame)
+        self.profiler.mark("send")
+        Command.wait_for_ack(connection)
+        self.profiler.mark("ack")
+
+        send_time = time.perf_counter() - start_time
+        self.frames_sent += 1
+        self.max_send_time = max(self.max_send_time, send_time)
+        if send_time > self.STALL_THRESHOLD:
+            self.stalls += 1
+
+    def connect(self) -> "Optional[socket.socket]":
+        """
+        Connect to the server, retrying with exponential backoff until connected or thread stopped.
+        """
+        backoff = self.RECONNECT_BACKOFF_MIN
+
+        while not self.stop_signal.is_set():
+            try:
+                connection = create_connection(self.address, timeout=self.CONNECT_TIMEOUT)
+                configure_low_latency(connection)
+                hello = Hello.recv(connection)
+                connection.settimeout(None)
+                self.connection = connection
+                self.plotter_enabled = hello.plotter
+                Logger.info("Connected to server %s, plotter enabled: %s.", self.address, hello.plotter)
+                return connection
+            except OSError as e:
+                Logger.warning("Connection to %s failed: %s, retrying in %.2fs.", self.address, e, backoff)
+                self.stop_signal.wait(backoff)
+                backoff = min(backoff * 2.0, self.RECONNECT_BACKOFF_MAX)
+
+        return None
+
+    def reconnect(self) -> "Optional[socket.socket]":
+        """
+        Re-establish connection. Logs time it took to reconnect.
+        """
+        start_time = time.perf_counter()
+        connection = self.connect()
+        if connection:
+            self.reconnects += 1
+            Logger.info("Reconnected in %.3fs.", time.perf_counter() - start_time)
+        return connection
@@ -16,6 +16,7 @@ class SensorCalibrationData:
     gains: NDArray
     angles: NDArray
 
+    @classmethod
     def from_json(cls, path="calibration.json") -> 'SensorCalibrationData':
         path = Path(path)
         data = json.loads(path.read_text())
@@ -30,6 +31,7 @@ class SensorCalibrationData:
 class SensorReading:
     timestamp: float
     data: NDArray
+    gyro: Optional[NDArray] = None
 
 
 class Sensor:
@@ -37,38 +39,95 @@ class Sensor:
         self.sensor:Any = sensor
         self.name:str = name
         self.calibration_data:Optional[SensorCalibrationData] = None
+        # Correction terms are kept precomputed so that the hot read path is a subtract and a multiply.
+        self.offset:NDArray = np.zeros(3)
+        self.inv_gains:NDArray = np.ones(3)
 
     def calibrate(self, calibration_data_path):
         self.calibration_data = SensorCalibrationData.from_json(calibration_data_path)
+        self.offset = np.array(self.calibration_data.offset, dtype=float)
+        self.inv_gains = 1.0 / np.array(self.calibration_data.gains, dtype=float)
+
+    def rest_magnitude(self) -> Optional[float]:
+        """
+        Magnitude of reading at rest with gains applied, i.e. gravity as measured by this sensor.
+        None if sensor is not calibrated.
+        """
+        if not self.calibration_data:
+            return None
+        return float(np.linalg.norm(self.offset * self.inv_gains))
 
     def enable(self):
         try:
             self.sensor.enable()
         except Exception as e:
-            Logger.exception(f"Failed to enable sensor: {self.name}")
+            Logger.exception("Failed to enable sensor: %s", self.name)
     
     def disable(self):
         self.sensor.disable()
 
     def correct(self, reading:NDArray):
         if self.calibration_data:
-            return (reading - self.calibration_data.offset) / self.calibration_data.gains
+            return (reading - self.offset) * self.inv_gains
         else:
             return reading
 
     def read(self, correct:bool=True) -> SensorReading:
+        buffer = np.empty((1, 3))
+        timestamp = self.read_into(buffer, 0, correct)
+        return SensorReading(timestamp=timestamp, data=buffer[0])
+
+    def read_into(self, buffer:NDArray, index:int, correct:bool=True) -> float:
+        """
+        Read single sample directly into row `index` of caller-owned (N, 3) buffer.
+        Returns sample timestamp.
+        """
         reading = self.read_raw()
         timestamp = time.perf_counter()
 
+        row = buffer[index]
         if reading and all(reading):
-            reading = np.array(reading)
+            row[:] = reading
         else:
-            reading = np.zeros(3)
+            row[:] = 0.0
+
+        if correct and self.calibration_data:
+            row -= self.offset
+            row *= self.inv_gains
+
+        return timestamp
+
+    def read_block(
+            self, buffer:NDArray, timestamps:Optional[NDArray]=None, correct:bool=True, interval:float=0.0) -> NDArray:
+        """
+        Fill every row of caller-owned (N, 3) buffer with consecutive samples taken `interval` seconds apart.
+        Calibration is applied once to the whole block instead of per sample.
+        If `timestamps` array is given, it receives per-sample timestamps.
+        Platform sensors return their latest cached value, so without `interval` every row of the block
+        would hold the same reading. Zero interval is only meant for sensors generating samples on demand.
+        """
+        read_raw = self.read_raw
+        clock = time.perf_counter
+        next_time = clock()
+
+        for index in range(len(buffer)):
+            if interval > 0.0:
+                time.sleep(max(0.0, next_time - clock()))
+                next_time += interval
+            reading = read_raw()
+            if timestamps is not None:
+                timestamps[index] = clock()
 
-        if correct:
-            reading = self.correct(reading)
+            if reading and all(reading):
+                buffer[index] = reading
+            else:
+                buffer[index] = 0.0
 
-        return SensorReading(timestamp=timestamp, data=reading)
+        if correct and self.calibration_data:
+            buffer -= self.offset
+            buffer *= self.inv_gains
+
+        return buffer
 
     def read_raw(self):
         raise NotImplementedError()
@@ -98,6 +157,21 @@ class DummySensor(Sensor):
     def read_raw(self):
         return np.random.random(3).tolist()
 
+    def read_block(
+            self, buffer:NDArray, timestamps:Optional[NDArray]=None, correct:bool=True, interval:float=0.0) -> NDArray:
+        """
+        Generate whole block of random samples with a single numpy call, without pacing.
+        """
+        buffer[:] = np.random.random(buffer.shape)
+        if timestamps is not None:
+            timestamps[:] = time.perf_counter()
+
+        if correct and self.calibration_data:
+            buffer -= self.offset
+            buffer *= self.inv_gains
+
+        return buffer
+
 
 class Gyroscope(Sensor):
     def __init__(self):
@@ -1,29 +1,64 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 import json
 from socket import socket
-from typing import List
+from typing import Any, Dict, List, Optional, Union
+
+
+INT16_MIN = -32768
+INT16_MAX = 32767
+
+# Every message is a single line of json, json.dumps never emits raw newlines.
+FRAME_DELIMITER = b"\n"
+ACK = b"ACK"
+# Longer frames are rejected, so that a peer never sending a delimiter cannot grow receive buffer without bound.
+MAX_FRAME_SIZE = 1 << 20
+
+
+class FrameTooLargeError(ValueError):
+    pass
 
 
 @dataclass
 class Command:
     """
     Represents mouse command, which can include:
-    - move: 3D mouse move vector
+    - move: 3D mouse move vector, computed by the server when acceleration is sent instead
     - dscroll: mouse wheel scroll change
     - click: buttons clicks
+    - plot_data: optional plot row, plot telemetry normally travels in separate PlotFrame messages
+    - scale: if set, move holds int16 fixed-point values (value = move / scale)
+    - telemetry: optional client diagnostics, e.g. step profile summary
+    - timestamp: client time at which the sample was taken, used to detect stale moves
+    - acceleration: calibrated raw acceleration, sent in server-side filtering mode
+    - speed: client speed factor applied to the move computed from acceleration, moves sent by client are already scaled
 
     Provides convenience method to serialize command as string.
     """
-    move: 'List[float]'
+    move: 'Optional[List[float]]' = None
     #dscroll:'Optional[int]'
-    click: 'List[bool]'
-    plot_data: 'List[List[float]]'
+    click: 'List[bool]' = field(default_factory=lambda: [False, False])
+    plot_data: 'Optional[List[float]]' = None
+    scale: 'Optional[float]' = None
+    telemetry: 'Optional[Dict[str, Any]]' = None
+    timestamp: 'Optional[float]' = None
+    acceleration: 'Optional[List[float]]' = None
+    speed: 'Optional[float]' = None
+
+    def get_move(self) -> 'List[float]':
+        """
+        Return move vector as floats, decoding fixed-point values if needed.
+        """
+        if self.move is None:
+            return [0.0, 0.0, 0.0]
+        if self.scale:
+            return decode_move(self.move, self.scale)
+        return self.move
 
     def asjson(self) -> str:
         """
-        Convert self to json string.
+        Convert self to json string. Unset optional fields are omitted to keep the packet small.
         """
-        return json.dumps(asdict(self))
+        return json.dumps({key: value for key, value in asdict(self).items() if value is not None})
     
     @classmethod
     def from_json(cls, json_str) -> 'Command':
@@ -32,21 +67,186 @@ class Command:
 
     def send(self, connection:socket):
         """
-        Encode command as json and send over socket.
+        Encode command as json frame and send over socket.
         """
-        connection.sendall(self.asjson().encode('utf-8'))
+        connection.sendall(encode_frame(self))
 
     @classmethod
-    def recv(cls, connection:socket):
-        data = connection.recv(1024)
-        data = data.decode('utf-8')
-        connection.sendall("ACK".encode("utf-8"))
-        return cls.from_json(data)
+    def wait_for_ack(cls, connection:socket) -> bool:
+        """
+        Receive acknowledgement of a single sent frame. Its bytes may arrive split over several reads,
+        exactly len(ACK) bytes are consumed.
+        """
+        ack = b""
+        while len(ack) < len(ACK):
+            data = connection.recv(len(ACK) - len(ack))
+            if not data:
+                raise ConnectionError("Connection closed by peer.")
+            ack += data
+        return ack == ACK
+
+
+@dataclass
+class PlotFrame:
+    """
+    Plot telemetry rows, sent separately from the control stream at a reduced rate.
+    """
+    rows: 'List[List[float]]'
+
+    def asjson(self) -> str:
+        return json.dumps(asdict(self))
 
     @classmethod
-    def wait_for_ack(cls, connection:socket):
-        ack = connection.recv(8).decode('utf-8')
-        if ack == "ACK":
-            return True
+    def from_json(cls, json_str) -> 'PlotFrame':
+        return PlotFrame(**json.loads(json_str))
+
+
+@dataclass
+class ClickEvent:
+    """
+    Mouse button edge, sent as soon as the button changes state instead of with the next Command.
+    - button: 0 for left, 1 for right button, same order as Command.click
+    - pressed: True on press, False on release
+    - timestamp: client time of the edge, used to measure click latency
+    """
+    button: int
+    pressed: bool
+    timestamp: 'Optional[float]' = None
+
+    def asjson(self) -> str:
+        return json.dumps(asdict(self))
+
+
+@dataclass
+class Hello:
+    """
+    Sent by the server right after accepting a connection to negotiate optional streams.
+    - plotter: whether server has a plotter connected and accepts PlotFrame messages
+    """
+    plotter: bool
+
+    def asjson(self) -> str:
+        return json.dumps(asdict(self))
+
+    def send(self, connection:socket):
+        connection.sendall(encode_frame(self))
+
+    @classmethod
+    def recv(cls, connection:socket) -> 'Hello':
+        """
+        Receive hello frame. Nothing else is sent by the server before the client sends, so reading
+        until the delimiter cannot consume following messages.
+        """
+        data = b""
+        while not data.endswith(FRAME_DELIMITER):
+            chunk = connection.recv(1024)
+            if not chunk:
+                raise ConnectionError("Connection closed by peer.")
+            data += chunk
+        return Hello(**json.loads(data))
+
+
+def encode_frame(message:'Union[Command, PlotFrame, ClickEvent, Hello]') -> bytes:
+    return message.asjson().encode('utf-8') + FRAME_DELIMITER
+
+
+def decode_message(frame:'Union[str, bytes, bytearray]') -> 'Union[Command, PlotFrame, ClickEvent]':
+    data = json.loads(frame)
+    if "rows" in data:
+        return PlotFrame(**data)
+    if "button" in data:
+        return ClickEvent(**data)
+    return Command(**data)
+
+
+class FrameReader:
+    """
+    Reassembles delimited frames from a stream socket, which may split a message or merge several.
+
+    Every read is a single recv_into into a reusable buffer and returns all frames it completed.
+    Incomplete tail stays in place and is only moved to the front once the buffer end is reached.
+    Buffer grows for long frames up to `max_frame_size`, a longer frame raises FrameTooLargeError.
+    """
+
+    def __init__(self, connection:socket, buffer_size:int=65536, max_frame_size:int=MAX_FRAME_SIZE):
+        self.connection = connection
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray(min(buffer_size, max_frame_size))
+        self.view = memoryview(self.buffer)
+        # Unparsed data is buffer[start:end], buffer[start:scanned] is known not to contain delimiter.
+        self.start = 0
+        self.end = 0
+        self.scanned = 0
+        self.reads = 0
+        self.frames = 0
+
+    def read(self) -> 'List[bytearray]':
+        """
+        Receive once, blocking until some data is available, and return complete frames in order.
+        """
+        if self.end == len(self.buffer):
+            self.make_room()
+
+        received = self.connection.recv_into(self.view[self.end:])
+        if not received:
+            raise ConnectionError("Connection closed by peer.")
+        self.end += received
+        self.reads += 1
+
+        frames = []
+        index = self.buffer.find(FRAME_DELIMITER, self.scanned, self.end)
+        while index >= 0:
+            frames.append(self.buffer[self.start:index])
+            self.start = index + 1
+            index = self.buffer.find(FRAME_DELIMITER, self.start, self.end)
+
+        if self.start == self.end:
+            self.start = self.end = 0
+        self.scanned = self.end
+        self.frames += len(frames)
+        return frames
+
+    def make_room(self):
+        tail = self.end - self.start
+        if self.start == 0:
+            if len(self.buffer) >= self.max_frame_size:
+                raise FrameTooLargeError(f"Frame exceeds {self.max_frame_size} bytes.")
+            # Single frame does not fit, buffer cannot be resized while view of it exists.
+            self.view.release()
+            self.buffer.extend(bytes(min(len(self.buffer), self.max_frame_size - len(self.buffer))))
+            self.view = memoryview(self.buffer)
         else:
-            return False
+            self.buffer[:tail] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, tail
+        self.scanned = self.end
+
+
+def decode_move(move:'List[int]', scale:float) -> 'List[float]':
+    """
+    Reconstruct float move vector from int16 fixed-point values.
+    """
+    return [value / scale for value in move]
+
+
+class MoveEncoder:
+    """
+    Quantizes float move vectors into int16 fixed-point deltas.
+    Rounding error is carried over into the next move so it does not accumulate as drift.
+    """
+
+    def __init__(self, scale:float=1000.0):
+        self.scale = scale
+        self.reset()
+
+    def reset(self):
+        self.residual = [0.0, 0.0, 0.0]
+
+    def encode(self, move:'List[float]') -> 'List[int]':
+        encoded = []
+        for axis, value in enumerate(move):
+            exact = value * self.scale + self.residual[axis]
+            rounded = int(round(exact))
+            # Only rounding error is carried over, saturated part of the move is dropped.
+            self.residual[axis] = exact - rounded
+            encoded.append(min(INT16_MAX, max(INT16_MIN, rounded)))
+        return encoded
@@ -1,8 +1,150 @@
+"""
+Logging setup shared by server, plotter and client.
+
+Records are handed to a background listener thread through a queue, so line formatting and I/O never run on
+the thread which logged them, only the message is interpolated there. Hot-path loggers are wrapped in ThrottledLogger, which samples and rate limits
+records before they are even created. Hot-path calls must pass arguments separately (logger.debug("x %s", x)),
+so that nothing is formatted for records which are dropped or disabled; tools/check_logging.py reports calls
+which format eagerly.
+"""
+import atexit
 import logging
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Iterable, Mapping, Optional
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class Throttle:
+    """
+    Sampling and rate limit of one logger.
+
+    @param sample_every: keep every n-th record.
+    @param rate: maximum records per second passing after sampling, None for no limit.
+    @param burst: number of records which may pass at once before rate limit applies.
+    """
+
+    def __init__(self, sample_every:int = 1, rate:Optional[float] = None, burst:int = 10):
+        self.sample_every = sample_every
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_time = time.monotonic()
+        self.seen = 0
+        self.suppressed = 0
+
+    def allow(self) -> bool:
+        self.seen += 1
+        if self.seen % self.sample_every:
+            self.suppressed += 1
+            return False
+        if self.rate is None:
+            return True
+
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_time) * self.rate)
+        self.last_time = now
+        if self.tokens < 1.0:
+            self.suppressed += 1
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class ThrottledLogger(logging.LoggerAdapter):
+    """
+    Logger for hot paths. Records below WARNING are dropped according to throttle before LogRecord is created.
+    First record passing after drops reports how many were suppressed.
+    """
+
+    def __init__(self, logger:logging.Logger, throttle:Throttle):
+        super().__init__(logger, None)
+        self.throttle = throttle
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        if level < logging.WARNING:
+            if not self.throttle.allow():
+                return
+            suppressed, self.throttle.suppressed = self.throttle.suppressed, 0
+            if suppressed and not (len(args) == 1 and isinstance(args[0], Mapping)):
+                if not args:
+                    msg = str(msg).replace("%", "%%")
+                msg = f"{msg} (%d similar records suppressed)"
+                args = (*args, suppressed)
+        super().log(level, msg, *args, **kwargs)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Queues records with interpolated message. Unlike QueueHandler, the line is not formatted on the calling
+    thread, listener runs in the same process, so records are not copied and exception info is kept.
+    """
+
+    def prepare(self, record:logging.LogRecord) -> logging.LogRecord:
+        # Arguments may change before listener gets to the record, e.g. views of a ring buffer.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class Listener(QueueListener):
+    """
+    QueueListener which may be stopped more than once, explicitly and again at interpreter exit.
+    """
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def skip_record_details():
+    """
+    Do not collect process details for every record, LOG_FORMAT does not use them.
+    """
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+
+def make_async(logger:logging.Logger, handlers:Optional[Iterable[logging.Handler]] = None) -> Listener:
+    """
+    Move output handlers of `logger` (or given `handlers`) to a listener thread and install queue handler instead.
+    Listener is stopped, i.e. queue is flushed, at interpreter exit.
+    """
+    if handlers is None:
+        handlers = list(logger.handlers)
+    handlers = list(handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+
+    queue = SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(queue))
+
+    listener = Listener(queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def configure_logging(level=logging.DEBUG) -> Listener:
+    """
+    Configure root logger to write to stderr from a listener thread. Called by application entry points,
+    not at import time.
+    """
+    skip_record_details()
+    root = logging.getLogger()
+    root.setLevel(level)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return make_async(root, [handler])
 
-logging.basicConfig(
-    level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
 
-def get_logger(name):
-    return logging.getLogger(name)
\ No newline at end of file
+def get_logger(name, throttle:Optional[Throttle] = None):
+    """
+    @param throttle: sampling and rate limit for hot-path loggers.
+    """
+    logger = logging.getLogger(name)
+    return ThrottledLogger(logger, throttle) if throttle else logger
@@ -1,7 +1,10 @@
 import numpy as np
 from numpy.typing import NDArray
 from typing import Any
-from collections import deque
+
+
+# Numeric precision of filter state. float32 halves memory traffic, which helps on ARM phones.
+PRECISIONS = {"float64": np.float64, "float32": np.float32}
 
 
 class Constants:
@@ -41,31 +44,142 @@ def device_space_to_world_space(vec:'np.array', device_orientation_vec:'np.array
     return v_world
 
 
+class OrientationFilter:
+    """
+    Complementary (Mahony-style) gyroscope + accelerometer fusion.
+
+    Keeps device orientation as a unit quaternion [w, x, y, z] (device -> world), integrates gyro rates
+    and corrects tilt drift towards the gravity direction measured by the accelerometer.
+    All updates are done on scalars in place, without constructing rotation matrices per sample.
+    """
+
+    def __init__(self, kp: float = 1.0, ki: float = 0.0, gravity: float = Constants.EARTH_ACC[2], dtype=np.float64):
+        """
+        Args:
+        - kp: proportional gain pulling orientation towards accelerometer gravity estimate.
+        - ki: integral gain compensating constant gyro bias.
+        - gravity: magnitude of gravity removed from world space acceleration.
+        - dtype: precision of returned acceleration, quaternion itself is kept in Python floats.
+        """
+        self.kp = kp
+        self.ki = ki
+        self.gravity = gravity
+        self.q = [1.0, 0.0, 0.0, 0.0]
+        self.integral_error = [0.0, 0.0, 0.0]
+        self.linear_acceleration = np.zeros(3, dtype=dtype)
+
+    def reset(self):
+        self.q[:] = (1.0, 0.0, 0.0, 0.0)
+        self.integral_error[:] = (0.0, 0.0, 0.0)
+        self.linear_acceleration[:] = 0.0
+
+    def update(self, gyro: NDArray, acceleration: NDArray, dt: float) -> NDArray:
+        """
+        Update orientation with gyro rates [rad/s] and accelerometer reading [m/s^2].
+
+        Returns:
+        - linear acceleration in world space with gravity removed. Returned array is reused between calls.
+        """
+        w, x, y, z = self.q
+        gx, gy, gz = float(gyro[0]), float(gyro[1]), float(gyro[2])
+        ax, ay, az = float(acceleration[0]), float(acceleration[1]), float(acceleration[2])
+
+        norm = (ax * ax + ay * ay + az * az) ** 0.5
+        if norm > 0.0:
+            nx, ny, nz = ax / norm, ay / norm, az / norm
+
+            # Gravity direction in device space predicted by current orientation.
+            vx = 2.0 * (x * z - w * y)
+            vy = 2.0 * (w * x + y * z)
+            vz = w * w - x * x - y * y + z * z
+
+            # Error between measured and predicted gravity direction.
+            ex = ny * vz - nz * vy
+            ey = nz * vx - nx * vz
+            ez = nx * vy - ny * vx
+
+            if self.ki > 0.0:
+                integral = self.integral_error
+                integral[0] += self.ki * ex * dt
+                integral[1] += self.ki * ey * dt
+                integral[2] += self.ki * ez * dt
+                gx += integral[0]
+                gy += integral[1]
+                gz += integral[2]
+
+            gx += self.kp * ex
+            gy += self.kp * ey
+            gz += self.kp * ez
+
+        # Integrate quaternion rate q' = 0.5 * q * (0, g).
+        half_dt = 0.5 * dt
+        w, x, y, z = (
+            w + (-x * gx - y * gy - z * gz) * half_dt,
+            x + (w * gx + y * gz - z * gy) * half_dt,
+            y + (w * gy - x * gz + z * gx) * half_dt,
+            z + (w * gz + x * gy - y * gx) * half_dt,
+        )
+        inv_norm = (w * w + x * x + y * y + z * z) ** -0.5
+        w, x, y, z = w * inv_norm, x * inv_norm, y * inv_norm, z * inv_norm
+        q = self.q
+        q[0], q[1], q[2], q[3] = w, x, y, z
+
+        # Rotate acceleration into world space and remove gravity.
+        out = self.linear_acceleration
+        out[0] = (1.0 - 2.0 * (y * y + z * z)) * ax + 2.0 * (x * y - w * z) * ay + 2.0 * (x * z + w * y) * az
+        out[1] = 2.0 * (x * y + w * z) * ax + (1.0 - 2.0 * (x * x + z * z)) * ay + 2.0 * (y * z - w * x) * az
+        out[2] = 2.0 * (x * z - w * y) * ax + 2.0 * (y * z + w * x) * ay + (1.0 - 2.0 * (x * x + y * y)) * az - self.gravity
+        return out
+
+
 class LowPassFilter:
-    def __init__(self, alpha=0.5):
+    def __init__(self, alpha=0.5, dtype=np.float64):
         self.alpha = alpha
+        self.dtype = dtype
         self.reset()
 
     def apply(self, current_value):
-        filtered_value = self.previous_filtered + self.alpha * (current_value - self.previous_filtered)
-        self.previous_filtered = filtered_value
-        return filtered_value
+        filtered_value = self.previous_filtered + self.alpha * (np.asarray(current_value, dtype=self.dtype) - self.previous_filtered)
+        self.previous_filtered = filtered_value.astype(self.dtype, copy=False)
+        return self.previous_filtered
     
     def reset(self):
-        self.previous_filtered = np.zeros(3)
+        self.previous_filtered = np.zeros(3, dtype=self.dtype)
 
 
 class RollingAverage:
-    def __init__(self, window=5):
+    """
+    Mean of the last `window` samples, kept in a preallocated ring buffer.
+    Returned array is reused by the next call.
+    """
+
+    def __init__(self, window=5, dtype=np.float64):
         self.window = window
+        self.dtype = dtype
+        self.mean = np.zeros(3, dtype=dtype)
         self.reset()
 
     def reset(self):
-        self.samples = deque([np.zeros(3) for _ in range(self.window)], maxlen=self.window)
+        self.samples = np.zeros((self.window, 3), dtype=self.dtype)
+        self.index = 0
+
+    def resize(self, window:int):
+        """
+        Change window size keeping the most recent samples. Growing window is padded with zeros.
+        """
+        if window == self.window:
+            return
+        # Oldest sample first.
+        ordered = np.roll(self.samples, -self.index, axis=0)[-window:]
+        self.samples = np.zeros((window, 3), dtype=self.dtype)
+        self.samples[window - len(ordered):] = ordered
+        self.window = window
+        self.index = 0
 
     def apply(self, current_value) -> NDArray:
-        self.samples.append(np.array(current_value))
-        return np.mean(np.array(self.samples), axis=0)
+        self.samples[self.index] = current_value
+        self.index = (self.index + 1) % self.window
+        return np.mean(self.samples, axis=0, out=self.mean)
 
 
 def trapezoidal_interpolation(sample, previous_sample, dt):
@@ -73,16 +187,23 @@ def trapezoidal_interpolation(sample, previous_sample, dt):
 
 
 class VelocityEstimator:
+    # Measured sample intervals are rounded to this step, transition model of every step is built once and cached.
+    DT_QUANTUM = 1e-4
+    # Longer gaps, e.g. after sensor pause, are integrated as this many nominal intervals.
+    MAX_DT_RATIO = 10.0
+    MAX_CACHED_MODELS = 256
+
     def __init__(
             self, dt: float = 0.05, process_noise_var: float = 0.02, measurement_noise_var: float = 0.01,
-            inactivity_threshold=None, inactivity_time_threshold=None):
+            inactivity_threshold=None, inactivity_time_threshold=None, dtype=np.float64):
         """
         Initializes the velocity estimator for 3D vectors with acceleration considered in the state.
         
         Args:
-        - dt: Sampling interval in seconds.
-        - process_noise_var: Variance of the process noise (applied to acceleration).
+        - dt: Nominal sampling interval in seconds, used when apply() is not given measured interval.
+        - process_noise_var: Variance of the process noise (applied to acceleration) per nominal interval.
         - measurement_noise_var: Variance of the measurement noise.
+        - dtype: precision of filter state and all intermediate results.
         """
         if inactivity_time_threshold is None: inactivity_time_threshold = 20.0 * dt
         if inactivity_threshold is None: inactivity_threshold = 0.5
@@ -94,43 +215,83 @@ class VelocityEstimator:
         self.z_movement_time_threshold = dt * 3.0
 
         self.dt = dt
+        self.dtype = dtype
         # State vector [vx, ax, vy, ay, vz, az] (velocity and acceleration in 3D)
-        self.x = np.zeros(6)
+        self.x = np.zeros(6, dtype=dtype)
         # Initial state covariance
-        self.P = np.eye(6) * 500  
+        self.P = np.eye(6, dtype=dtype) * 500
         # State transition model
         self.F = np.array([[1, dt, 0, 0, 0, 0],
                            [0, 1, 0, 0, 0, 0],
                            [0, 0, 1, dt, 0, 0],
                            [0, 0, 0, 1, 0, 0],
                            [0, 0, 0, 0, 1, dt],
-                           [0, 0, 0, 0, 0, 1]])
+                           [0, 0, 0, 0, 0, 1]], dtype=dtype)
         # Measurement model (measuring acceleration in 3D)
         self.H = np.array([[0, 1, 0, 0, 0, 0],
                            [0, 0, 0, 1, 0, 0],
-                           [0, 0, 0, 0, 0, 1]])
+                           [0, 0, 0, 0, 0, 1]], dtype=dtype)
+        self.FT = self.F.T.copy()
+        self.HT = self.H.T.copy()
+        # Quantized dt -> (F, FT, Q) for measured sample intervals.
+        self.models = {}
+        self.set_noise(process_noise_var, measurement_noise_var)
+        # Control input model (unused in this case, but defined for completeness)
+        self.B = np.zeros((6, 3), dtype=dtype)
+        # Control input (unused)
+        self.u = np.zeros(3, dtype=dtype)
+
+        # Preallocated intermediate results, so that apply() does not allocate.
+        self.z = np.zeros(3, dtype=dtype)
+        self.x_prior = np.zeros(6, dtype=dtype)
+        self.y = np.zeros(3, dtype=dtype)
+        self.FP = np.zeros((6, 6), dtype=dtype)
+        self.PHT = np.zeros((6, 3), dtype=dtype)
+        self.S = np.zeros((3, 3), dtype=dtype)
+        self.K = np.zeros((6, 3), dtype=dtype)
+        self.Ky = np.zeros(6, dtype=dtype)
+        self.HP = np.zeros((3, 6), dtype=dtype)
+        self.KHP = np.zeros((6, 6), dtype=dtype)
+
+    def set_noise(self, process_noise_var: float, measurement_noise_var: float):
+        """
+        Set noise variances. State and covariance are kept, so it can be called on a running filter.
+        """
         # Process noise (higher uncertainty in acceleration)
-        self.Q = np.eye(6) * process_noise_var
+        self.Q = np.eye(6, dtype=self.dtype) * process_noise_var
         self.Q[1, 1], self.Q[3, 3], self.Q[5, 5] = process_noise_var * 10, process_noise_var * 10, process_noise_var * 10  # Increase for ax, ay, az
         # Measurement noise
-        self.R = np.eye(3) * measurement_noise_var
-        # Control input model (unused in this case, but defined for completeness)
-        self.B = np.zeros((6, 3))
-        # Control input (unused)
-        self.u = np.zeros(3)
+        self.R = np.eye(3, dtype=self.dtype) * measurement_noise_var
+        self.models.clear()
 
-    def check_and_reset_on_z_movement(self, current_acceleration):
+    def model(self, dt: float):
+        """
+        Returns (F, F.T, Q) for sample interval dt. Process noise grows linearly with the interval.
+        """
+        key = int(dt / self.DT_QUANTUM + 0.5)
+        model = self.models.get(key)
+        if model is None:
+            if len(self.models) >= self.MAX_CACHED_MODELS:
+                self.models.clear()
+            # Clamped only when building, so that lookup stays a single dict access.
+            dt = min(max(key, 1) * self.DT_QUANTUM, self.dt * self.MAX_DT_RATIO)
+            F = self.F.copy()
+            F[0, 1], F[2, 3], F[4, 5] = dt, dt, dt
+            model = self.models[key] = (F, F.T.copy(), self.Q * (dt / self.dt))
+        return model
+
+    def check_and_reset_on_z_movement(self, current_acceleration, dt: float):
         if abs(current_acceleration[2]) > self.inactivity_threshold:
-            self.z_movement_timer += self.dt
+            self.z_movement_timer += dt
             if self.z_movement_timer > self.z_movement_time_threshold:
                 self.reset()
                 self.z_movement_timer = 0.0
         else:
             self.z_movement_timer = 0.0
 
-    def check_and_reset_inactivity(self, current_acceleration):
+    def check_and_reset_inactivity(self, current_acceleration, dt: float):
         if (np.linalg.norm(current_acceleration[:2]) < self.inactivity_threshold):
-            self.inactivity_timer += self.dt
+            self.inactivity_timer += dt
             if self.inactivity_timer > self.inactivity_time_threshold:
                 self.reset()
                 self.inactivity_timer = 0.0
@@ -141,33 +302,197 @@ class VelocityEstimator:
         """
         Resets the filter to initial state.
         """
-        self.x = np.zeros(6)
-        self.P = np.eye(6) * 500
+        self.x[:] = 0.0
+        self.P[:] = np.eye(6) * 500
 
-    def apply(self, current_acceleration: NDArray) -> NDArray:
+    def apply(self, current_acceleration: NDArray, dt: float = None) -> NDArray:
         """
         Applies the Kalman filter update with a new 3D acceleration measurement.
         
         Args:
         - current_acceleration: The current acceleration measurement [ax, ay, az].
+        - dt: Measured time since previous measurement, nominal interval is used if None.
         
         Returns: 
         - The estimated velocity [vx, vy, vz] in 3D.
         """
-        self.check_and_reset_inactivity(current_acceleration)
-        self.check_and_reset_on_z_movement(current_acceleration)
+        if dt is None:
+            dt, F, FT, Q = self.dt, self.F, self.FT, self.Q
+        else:
+            F, FT, Q = self.model(dt)
+
+        self.check_and_reset_inactivity(current_acceleration, dt)
+        self.check_and_reset_on_z_movement(current_acceleration, dt)
+
+        x, P = self.x, self.P
 
         # Predict
-        self.x = np.dot(self.F, self.x) + np.dot(self.B, self.u)
-        self.P = np.dot(self.F, np.dot(self.P, self.F.T)) + self.Q
+        np.dot(F, x, out=self.x_prior)
+        if self.u.any():
+            self.x_prior += np.dot(self.B, self.u)
+        np.dot(F, P, out=self.FP)
+        np.dot(self.FP, FT, out=P)
+        P += Q
 
         # Update
-        Z = np.array(current_acceleration)  # Measurement
-        y = Z - np.dot(self.H, self.x)  # Measurement residual
-        S = np.dot(self.H, np.dot(self.P, self.H.T)) + self.R  # Residual covariance
-        K = np.dot(self.P, np.dot(self.H.T, np.linalg.inv(S)))  # Kalman gain
-        self.x = self.x + np.dot(K, y)
-        self.P = self.P - np.dot(K, np.dot(self.H, self.P))
+        self.z[:] = current_acceleration  # Measurement
+        np.subtract(self.z, np.dot(self.H, self.x_prior, out=self.y), out=self.y)  # Measurement residual
+        np.dot(P, self.HT, out=self.PHT)
+        np.dot(self.H, self.PHT, out=self.S)
+        self.S += self.R  # Residual covariance
+        np.dot(self.PHT, np.linalg.inv(self.S), out=self.K)  # Kalman gain
+        np.add(self.x_prior, np.dot(self.K, self.y, out=self.Ky), out=x)
+        np.dot(self.H, P, out=self.HP)
+        P -= np.dot(self.K, self.HP, out=self.KHP)
 
         # Return estimated velocity (3D)
-        return self.x[::2]  # Extracting vx, vy, and vz from the state vector
+        return x[::2]  # Extracting vx, vy, and vz from the state vector
+
+
+class VelocityEstimatorBank:
+    """
+    RollingAverage -> VelocityEstimator pipeline for many clients at once.
+
+    State of all clients is kept in stacked arrays: x (clients, 6), P (clients, 6, 6) and rolling average
+    samples (clients, window, 3), so that a single numpy step updates every client which sent a sample.
+    Follows the same model and reset rules as VelocityEstimator.
+    """
+
+    def __init__(
+            self, dt: float = 0.05, process_noise_var: float = 0.02, measurement_noise_var: float = 0.01,
+            inactivity_threshold=None, inactivity_time_threshold=None, running_average_window: int = 5,
+            capacity: int = 8, dtype=np.float64):
+        reference = VelocityEstimator(
+            dt, process_noise_var, measurement_noise_var, inactivity_threshold, inactivity_time_threshold, dtype
+        )
+        self.dt = dt
+        self.dtype = dtype
+        self.F, self.H, self.Q, self.R = reference.F, reference.H, reference.Q, reference.R
+        self.FT, self.HT = reference.FT, reference.HT
+        self.inactivity_threshold = reference.inactivity_threshold
+        self.inactivity_time_threshold = reference.inactivity_time_threshold
+        self.z_movement_time_threshold = reference.z_movement_time_threshold
+        self.window = running_average_window
+
+        self.free_slots = []
+        self.allocate(capacity)
+
+    def allocate(self, capacity: int):
+        """
+        Grow state arrays to given capacity, keeping existing client state.
+        """
+        previous = getattr(self, "capacity", 0)
+        self.capacity = capacity
+
+        def grow(name, shape, dtype=float):
+            grown = np.zeros((capacity, *shape), dtype=dtype)
+            if previous:
+                grown[:previous] = getattr(self, name)
+            setattr(self, name, grown)
+
+        grow("x", (6,), self.dtype)
+        grow("P", (6, 6), self.dtype)
+        grow("samples", (self.window, 3), self.dtype)
+        grow("sample_index", (), int)
+        grow("inactivity_timer", ())
+        grow("z_movement_timer", ())
+
+        self.free_slots.extend(reversed(range(previous, capacity)))
+
+    def add_client(self) -> int:
+        """
+        Reserve state slot for new client. Returns slot index.
+        """
+        if not self.free_slots:
+            self.allocate(self.capacity * 2)
+        slot = self.free_slots.pop()
+        self.reset(np.array([slot]))
+        self.samples[slot] = 0.0
+        self.sample_index[slot] = 0
+        self.inactivity_timer[slot] = 0.0
+        self.z_movement_timer[slot] = 0.0
+        return slot
+
+    def remove_client(self, slot: int):
+        self.free_slots.append(slot)
+
+    def reset(self, slots: NDArray):
+        """
+        Reset Kalman state of given slots to initial state.
+        """
+        if len(slots) == 0:
+            return
+        self.x[slots] = 0.0
+        self.P[slots] = np.eye(6) * 500
+
+    def apply(self, slots: NDArray, measurements: NDArray, intervals: NDArray = None) -> NDArray:
+        """
+        Update given client slots with one acceleration sample each.
+
+        Args:
+        - slots: (n,) array of distinct client slots.
+        - measurements: (n, 3) acceleration samples.
+        - intervals: (n,) measured sample intervals, clamped like in VelocityEstimator.model. Nominal dt if None.
+
+        Returns:
+        - (n, 3) estimated velocities.
+        """
+        slots = np.asarray(slots, dtype=int)
+        measurements = np.asarray(measurements, dtype=self.dtype)
+
+        # Rolling average over last `window` samples of every client.
+        self.samples[slots, self.sample_index[slots]] = measurements
+        self.sample_index[slots] = (self.sample_index[slots] + 1) % self.window
+        z = self.samples[slots].mean(axis=1)
+
+        if intervals is None:
+            self.check_and_reset(slots, z, self.dt)
+            x = self.x[slots]
+            P = self.P[slots]
+
+            # Predict
+            x = x @ self.FT
+            P = self.F @ P @ self.FT + self.Q
+        else:
+            intervals = np.asarray(intervals, dtype=float)
+            self.check_and_reset(slots, z, intervals)
+            dt = np.clip(intervals, VelocityEstimator.DT_QUANTUM, self.dt * VelocityEstimator.MAX_DT_RATIO)
+            x = self.x[slots]
+            P = self.P[slots]
+
+            # Predict with per-client transition model, process noise grows linearly with the interval.
+            F = np.broadcast_to(self.F, (len(slots), 6, 6)).copy()
+            F[:, 0, 1] = F[:, 2, 3] = F[:, 4, 5] = dt
+            x = (F @ x[:, :, None])[:, :, 0]
+            P = F @ P @ F.transpose(0, 2, 1) + self.Q * (dt / self.dt).astype(self.dtype)[:, None, None]
+
+        # Update
+        y = z - x @ self.HT
+        PHT = P @ self.HT
+        S = self.H @ PHT + self.R
+        K = PHT @ np.linalg.inv(S)
+        x = x + (K @ y[:, :, None])[:, :, 0]
+        P = P - K @ (self.H @ P)
+
+        self.x[slots] = x
+        self.P[slots] = P
+        return x[:, ::2]
+
+    def check_and_reset(self, slots: NDArray, z: NDArray, dt: "float | NDArray"):
+        """
+        Vectorized inactivity and z-movement resets, same rules as in VelocityEstimator.
+        Timers advance by `dt`, a scalar or per-slot intervals.
+        """
+        inactive = np.linalg.norm(z[:, :2], axis=1) < self.inactivity_threshold
+        timer = np.where(inactive, self.inactivity_timer[slots] + dt, 0.0)
+        expired = timer > self.inactivity_time_threshold
+        timer[expired] = 0.0
+        self.inactivity_timer[slots] = timer
+        self.reset(slots[expired])
+
+        z_moving = np.abs(z[:, 2]) > self.inactivity_threshold
+        timer = np.where(z_moving, self.z_movement_timer[slots] + dt, 0.0)
+        expired = timer > self.z_movement_time_threshold
+        timer[expired] = 0.0
+        self.z_movement_timer[slots] = timer
+        self.reset(slots[expired])
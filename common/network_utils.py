@@ -1,9 +1,107 @@
-from typing import Tuple
+import os
+import socket
+import stat
+import sys
+from typing import Tuple, Union
 
 
-def parse_address(address:str) -> Tuple[str, int]:
+KEEPALIVE_IDLE = 2
+KEEPALIVE_INTERVAL = 1
+KEEPALIVE_COUNT = 3
+
+# Same-host peers may use a Unix domain socket, e.g. "unix:/tmp/imouse.sock", skipping the TCP stack.
+UNIX_PREFIX = "unix:"
+
+# (host, port) for TCP, socket path for AF_UNIX.
+Address = Union[Tuple[str, int], str]
+
+
+def parse_address(address:str) -> Address:
+    if address.startswith(UNIX_PREFIX):
+        return address[len(UNIX_PREFIX):] or None
     try:
         addr, port = address.split(":")
         return addr, int(port)
     except:
         return None
+
+
+def is_unix_address(address:Address) -> bool:
+    return isinstance(address, str)
+
+
+def format_peer(address:Address, connection:socket.socket) -> str:
+    """
+    Name of accepted peer. Unix domain socket peers are unnamed, so they are told apart by file descriptor.
+    """
+    if connection.family == getattr(socket, "AF_UNIX", None):
+        return "%s#%d" % (UNIX_PREFIX, connection.fileno())
+    return "%s:%d" % address[:2]
+
+
+def create_connection(address:Address, timeout:float = None) -> socket.socket:
+    """
+    Connect to TCP or Unix domain socket address.
+    """
+    if not is_unix_address(address):
+        return socket.create_connection(address, timeout=timeout)
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.settimeout(timeout)
+        connection.connect(address)
+    except:
+        connection.close()
+        raise
+    return connection
+
+
+def configure_low_latency(connection:socket.socket):
+    """
+    Disable Nagle's algorithm and enable keepalive so that dead peer is detected within a few seconds.
+    Unix domain sockets have neither, there is nothing to configure.
+    """
+    if connection.family not in (socket.AF_INET, socket.AF_INET6):
+        return
+
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    connection.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+    elif hasattr(socket, "SIO_KEEPALIVE_VALS"):
+        connection.ioctl(socket.SIO_KEEPALIVE_VALS, (1, KEEPALIVE_IDLE * 1000, KEEPALIVE_INTERVAL * 1000))
+
+    if hasattr(socket, "TCP_KEEPCNT"):
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, KEEPALIVE_COUNT)
+
+
+def supports_reuse_port(address:Address) -> bool:
+    """
+    Whether several processes may each bind their own listener to address, with connections balanced by kernel.
+    """
+    return not is_unix_address(address) and hasattr(socket, "SO_REUSEPORT")
+
+
+def create_listener(address:Address, reuse_port:bool = False) -> socket.socket:
+    """
+    Create long-lived, non-blocking listening socket.
+    Socket file left behind by a previous Unix domain socket listener is replaced.
+    With `reuse_port` the TCP address may be bound by other listeners with the same option.
+    """
+    if is_unix_address(address):
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+            os.unlink(address)
+    else:
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # On Windows SO_REUSEADDR allows stealing a bound port, and rebinding after close works without it.
+        if sys.platform != "win32":
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    listener.bind(address)
+    listener.listen()
+    listener.setblocking(False)
+    return listener
@@ -0,0 +1,44 @@
+"""
+Blocks of plot rows exchanged between data producers (servers, test sources) and the plotter.
+
+A block is a (rows, columns) array tagged with source and channel. It travels as raw array bytes with
+dtype and shape, one queue item per block, so the manager connection pickles a single bytes object
+instead of a list per row. Decoded array is a read-only view of the received bytes.
+"""
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+DEFAULT_SOURCE = "default"
+
+
+@dataclass
+class PlotBlock:
+    """
+    @param source: name of the producer, e.g. client address, plotted in its own column.
+    @param channel: axes group filled by the block columns, e.g. "acc" for "acc.x", "acc.y", "acc.z".
+        None means block columns map to all plot axes in order.
+    @param rows: (rows, columns) array.
+    """
+    source: str
+    channel: Optional[str]
+    rows: NDArray
+
+    def encode(self) -> Tuple[str, Optional[str], str, Tuple[int, ...], bytes]:
+        """
+        Encode into a queue item of plain types: (source, channel, dtype, shape, array bytes).
+        """
+        return self.source, self.channel, self.rows.dtype.str, self.rows.shape, self.rows.tobytes()
+
+    @staticmethod
+    def decode(item:Any) -> "PlotBlock":
+        """
+        Decode queue item. Plain rows (list of floats) sent by older producers are accepted as single row blocks.
+        """
+        if isinstance(item, tuple) and len(item) == 5:
+            source, channel, dtype, shape, data = item
+            return PlotBlock(source, channel, np.frombuffer(data, dtype=dtype).reshape(shape))
+        return PlotBlock(DEFAULT_SOURCE, None, np.array([item], dtype=float))
@@ -0,0 +1,108 @@
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence
+
+
+# Histogram bucket upper bounds in seconds, log-spaced from 10us to 1s.
+DEFAULT_BUCKET_BOUNDS = [
+    base * 10.0 ** exp for exp in range(-5, 0) for base in (1.0, 2.0, 5.0)
+] + [1.0]
+
+
+class Histogram:
+    """
+    Fixed-size histogram of durations. Recording does not allocate.
+    """
+
+    def __init__(self, bounds:Sequence[float]=DEFAULT_BUCKET_BOUNDS):
+        self.bounds = list(bounds)
+        self.reset()
+
+    def reset(self):
+        # Last bucket collects everything above the highest bound.
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value:float):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q:float) -> float:
+        """
+        Approximate percentile as upper bound of the bucket containing it, capped at maximum.
+        """
+        if self.count == 0:
+            return 0.0
+
+        rank = q / 100.0 * self.count
+        cumulative = 0
+        for index, bucket in enumerate(self.buckets):
+            cumulative += bucket
+            if cumulative >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class StageProfiler:
+    """
+    Records monotonic time spent in consecutive stages of a processing step.
+
+    Usage:
+        profiler.begin()
+        ...
+        profiler.mark("filter")   # time since begin()
+        ...
+        profiler.mark("send")     # time since previous mark
+
+    When disabled, begin() and mark() return immediately.
+    """
+
+    def __init__(self, stages:List[str], enabled:bool=False):
+        self.enabled = enabled
+        self.stages = list(stages)
+        self.histograms:Dict[str, Histogram] = {stage: Histogram() for stage in self.stages}
+        self.last_time = time.perf_counter()
+
+    def begin(self):
+        if self.enabled:
+            self.last_time = time.perf_counter()
+
+    def mark(self, stage:str):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.histograms[stage].record(now - self.last_time)
+        self.last_time = now
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    def summary(self) -> Dict[str, List[int]]:
+        """
+        Compact per-stage summary: [count, mean_us, p50_us, p99_us, max_us].
+        """
+        return {
+            stage: [
+                histogram.count,
+                int(histogram.mean() * 1e6),
+                int(histogram.percentile(50) * 1e6),
+                int(histogram.percentile(99) * 1e6),
+                int(histogram.max * 1e6),
+            ]
+            for stage, histogram in self.histograms.items()
+        }
+
+    def format_summary(self) -> str:
+        lines = ["stage: count | mean | p50 | p99 | max [us]"]
+        for stage, (count, mean, p50, p99, max_) in self.summary().items():
+            lines.append(f"{stage}: {count} | {mean} | {p50} | {p99} | {max_}")
+        return "\n".join(lines)
@@ -1,7 +1,7 @@
 from multiprocessing import Queue
 from multiprocessing.managers import BaseManager
+from queue import SimpleQueue
 
-from pyqt_plotter import Plotter
 from config import PlotConfig
 
 from common.network_utils import parse_address
@@ -11,7 +11,9 @@ logger = logger_config.get_logger(__name__)
 
 
 class QueueManager(BaseManager):
-    queue = Queue()
+    # Lives in the manager process and is only accessed through proxies, so a thread queue is enough
+    # and items are not pickled a second time as they would be by multiprocessing.Queue.
+    queue = SimpleQueue()
 
 
 def get_shared_queue():
@@ -40,7 +42,7 @@ class QueueServer:
 
 def main(config: PlotConfig):
     address = parse_address(config.address)
-    logger.info("Address: %s : %d", *address)
+    logger.info("Address: %s", config.address)
     queue_server = QueueServer(address, config.authkey)
     queue_server.start()
 
@@ -48,6 +50,9 @@ def main(config: PlotConfig):
     queue_manager.connect()
     queue = queue_manager.get_queue()
 
+    # Qt stack is heavy, load it only when plotter window is actually started.
+    from pyqt_plotter import Plotter
+
     logger.info("Starting plotter...")
     plotter = Plotter(config, queue)
     plotter.run()
@@ -56,6 +61,7 @@ def main(config: PlotConfig):
 
 
 if __name__ == "__main__":
+    logger_config.configure_logging()
     try:
         config = PlotConfig.from_json()
         main(config)
@@ -9,6 +9,8 @@ visualisation using pyqtgraph package.
 import common.logger_config as logger_config
 
 logger = logger_config.get_logger(__name__)
+# Logs every plotted row.
+rows_logger = logger_config.get_logger(f"{__name__}.rows", logger_config.Throttle(rate=10.0))
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -36,7 +38,7 @@ class Plotter:
         ]
 
     def add_data(self, vec):
-        logger.info(f"adding data to plot: {vec}")
+        rows_logger.debug("adding data to plot: %s", vec)
         for data, new_data in zip(self.data, vec):
             data.append(new_data)
 
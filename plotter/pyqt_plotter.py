@@ -3,25 +3,51 @@ Data visualization module for iMouse using PyQt5 and pyqtgraph frameworks.
 """
 
 import sys
+import time
 import common.logger_config as logger_config
 
 logger = logger_config.get_logger(__name__)
 
 import numpy as np
 from collections import deque
+from queue import Empty
+from typing import Deque, Dict, List, Optional
 
 from config import PlotConfig
 from multiprocessing import Queue
 
+from common.plot_block import PlotBlock
+from common.profiler import Histogram
+
+# Bucket bounds for per tick row and block counts.
+COUNT_BUCKET_BOUNDS = [2 ** exp for exp in range(17)]
+
 from PyQt5.QtWidgets import QApplication, QMainWindow
 from PyQt5.QtCore import QTimer
 import pyqtgraph
 
 
+class PlotSource:
+    """
+    Plot history and curves of a single data source, shown as one column of plots.
+    """
+
+    def __init__(self, npoints:int, naxes:int):
+        self.data:List[Deque[float]] = [deque(np.zeros(npoints), maxlen=npoints) for _ in range(naxes)]
+        self.curves = []
+
+    def add_rows(self, axes:"List[int]", rows:np.ndarray):
+        # Whole columns are appended at once, so ingestion cost does not grow with number of blocks.
+        for axis, column in zip(axes, rows.T.tolist()):
+            self.data[axis].extend(column)
+
+
 class PlotterWindow(QMainWindow):
     """
-    Intented to be run as a separate process due to matplotlib restrictions regarding running in main thread.
+    Plots blocks of rows received from any number of sources, each source in its own column.
+    Records frame time, rows ingested per tick and queue backlog, logged every STATS_INTERVAL seconds.
     """
+    STATS_INTERVAL = 10.0
 
     def __init__(self, plot_config: PlotConfig, data_queue: Queue):
         super().__init__()
@@ -31,10 +57,13 @@ class PlotterWindow(QMainWindow):
         self.window_title = self.config.window_title
 
         self.axes = self.config.axes
-        self.data = [
-            deque(np.zeros(self.config.npoints), maxlen=self.config.npoints)
-            for _ in self.axes
-        ]
+        self.sources:Dict[str, PlotSource] = {}
+        self.channel_axes:Dict[Optional[str], List[int]] = {None: list(range(len(self.axes)))}
+
+        self.frame_time = Histogram()
+        self.rows_per_tick = Histogram(COUNT_BUCKET_BOUNDS)
+        self.backlog = Histogram(COUNT_BUCKET_BOUNDS)
+        self.last_stats_time = time.perf_counter()
 
         self.initialize_ui()
 
@@ -42,20 +71,6 @@ class PlotterWindow(QMainWindow):
         self.graph_widget = pyqtgraph.GraphicsLayoutWidget()
         self.setCentralWidget(self.graph_widget)
 
-        self.plots = []
-        self.curves = []
-
-        for index, title in enumerate(self.axes):
-            plot = self.graph_widget.addPlot(row=index, col=0)
-            plot.setTitle(title)
-            plot.setYRange(min=self.config.scale[0], max=self.config.scale[1])
-            curve = plot.plot(pen=pyqtgraph.mkPen(width=2))
-            self.plots.append(plot)
-            self.curves.append(curve)
-
-            if index < len(self.axes):
-                self.graph_widget.nextRow()
-
         self.setWindowTitle(self.window_title)
         self.resize(*self.config.figsize)
 
@@ -64,19 +79,78 @@ class PlotterWindow(QMainWindow):
         self.timer.timeout.connect(self.update_plot)
         self.timer.start()
 
-    def add_data(self, vec):
-        logger.info(f"adding data to plot: {vec}")
-        for data, new_data in zip(self.data, vec):
-            data.append(new_data)
+    def add_source(self, name:str) -> PlotSource:
+        """
+        Create history and column of plots for a new source.
+        """
+        logger.info("New plot source: %s", name)
+        source = PlotSource(self.config.npoints, len(self.axes))
+        column = len(self.sources)
 
-    def update_plot(self):
-        while not self.queue.empty():
-            new_data = self.queue.get()
-            self.add_data(new_data)
-            logger.debug(f"received data: {new_data}")
+        for index, title in enumerate(self.axes):
+            plot = self.graph_widget.addPlot(row=index, col=column)
+            plot.setTitle(f"{name} {title}")
+            plot.setYRange(min=self.config.scale[0], max=self.config.scale[1])
+            source.curves.append(plot.plot(pen=pyqtgraph.mkPen(width=2)))
+
+        self.sources[name] = source
+        return source
+
+    def get_channel_axes(self, channel:str) -> List[int]:
+        """
+        Indices of axes filled by channel, e.g. channel "acc" fills "acc.x", "acc.y", "acc.z".
+        """
+        if channel not in self.channel_axes:
+            self.channel_axes[channel] = [
+                index for index, title in enumerate(self.axes)
+                if title == channel or title.startswith(channel + ".")
+            ]
+        return self.channel_axes[channel]
+
+    def add_block(self, block:PlotBlock):
+        source = self.sources.get(block.source) or self.add_source(block.source)
+        source.add_rows(self.get_channel_axes(block.channel), block.rows)
 
-        for curve, data in zip(self.curves, self.data):
-            curve.setData(data)
+    def update_plot(self):
+        start_time = time.perf_counter()
+
+        # Only blocks queued before the tick are ingested, so a producer faster than the plotter
+        # shows up as growing backlog instead of a frozen window.
+        backlog = self.queue.qsize()
+        rows = 0
+        for _ in range(backlog):
+            try:
+                item = self.queue.get_nowait()
+            except Empty:
+                break
+            block = PlotBlock.decode(item)
+            self.add_block(block)
+            rows += len(block.rows)
+
+        for source in self.sources.values():
+            for curve, data in zip(source.curves, source.data):
+                curve.setData(data)
+
+        self.frame_time.record(time.perf_counter() - start_time)
+        self.rows_per_tick.record(rows)
+        self.backlog.record(backlog)
+        if start_time - self.last_stats_time >= self.STATS_INTERVAL:
+            self.log_stats()
+            self.last_stats_time = start_time
+
+    def reset_stats(self):
+        self.frame_time.reset()
+        self.rows_per_tick.reset()
+        self.backlog.reset()
+
+    def log_stats(self):
+        logger.info(
+            "Plot ticks: %d, frame time p50/p99/max: %.1f/%.1f/%.1f ms, rows per tick mean/max: %.0f/%.0f, "
+            "backlog max: %.0f blocks",
+            self.frame_time.count, self.frame_time.percentile(50) * 1e3, self.frame_time.percentile(99) * 1e3,
+            self.frame_time.max * 1e3, self.rows_per_tick.mean(), self.rows_per_tick.max, self.backlog.max,
+        )
+        self.reset_stats()
 
 
 class Plotter:
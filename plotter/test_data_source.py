@@ -1,25 +1,51 @@
 """
 This module can be used to test plotter application.
-It connects to the plotter queue server and produces random data.
+It connects to the plotter queue server and produces blocks of random data from one or more sources.
 """
 
 import common.logger_config as logger_config
 logger = logger_config.get_logger(__name__)
 
+import argparse
 import time
 from multiprocessing.managers import BaseManager
 from config import PlotConfig
 from numpy.random import random
 
 from common.network_utils import parse_address
+from common.plot_block import PlotBlock
 
 
 class QueueManager(BaseManager):
     pass
 
 
-def main():
+def parse_args():
+    parser = argparse.ArgumentParser(description="Plotter load driver.")
+    parser.add_argument("--rate", type=float, default=10.0, help="Rows per second sent by each source.")
+    parser.add_argument("--sources", type=int, default=1, help="Number of simulated data sources.")
+    parser.add_argument("--channels", type=int, help="Values per row, number of plot axes by default.")
+    parser.add_argument("--block-rows", type=int, default=1, help="Rows per block.")
+    parser.add_argument("--burst-on", type=float, default=0.0, help="Length of sending phase in seconds, 0 sends steadily.")
+    parser.add_argument("--burst-off", type=float, default=0.0, help="Length of pause between sending phases in seconds.")
+    parser.add_argument("--duration", type=float, default=0.0, help="Stop after given number of seconds, 0 runs until plotter exits.")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    return parser.parse_args()
+
+
+def is_sending(args, elapsed:float) -> bool:
+    """
+    Whether burst pattern is in sending phase.
+    """
+    if args.burst_on <= 0 or args.burst_off <= 0:
+        return True
+    return elapsed % (args.burst_on + args.burst_off) < args.burst_on
+
+
+def main(args):
     config = PlotConfig.from_json()
+    channels = args.channels or len(config.axes)
+    block_interval = args.block_rows / args.rate
 
     logger.info("Initializing queue manager...")
     QueueManager.register("get_queue")
@@ -33,17 +59,41 @@ def main():
     logger.info("Queue server connected.")
     queue = queue_manager.get_queue()
 
+    logger.info(
+        "Sending %.0f rows/s x %d channels from %d sources in blocks of %d rows.",
+        args.rate, channels, args.sources, args.block_rows,
+    )
+    start_time = next_time = last_report_time = time.perf_counter()
+    rows_sent = 0
+
     is_running = True
     while is_running:
         try:
-            logger.info("sending data packet...")
-            queue.put(random(3).tolist())
-            time.sleep(0.1)
+            now = time.perf_counter()
+            elapsed = now - start_time
+            if args.duration and elapsed >= args.duration:
+                break
+
+            if is_sending(args, elapsed):
+                for source in range(args.sources):
+                    block = PlotBlock(f"source-{source}", None, random((args.block_rows, channels)))
+                    queue.put(block.encode())
+                rows_sent += args.block_rows * args.sources
+
+            if now - last_report_time >= args.report_interval:
+                logger.info(
+                    "Sent %.0f rows/s, plotter backlog: %d blocks.", rows_sent / (now - last_report_time), queue.qsize()
+                )
+                rows_sent, last_report_time = 0, now
+
+            # Schedule is kept absolute, so that time spent sending does not lower the rate.
+            next_time += block_interval
+            time.sleep(max(0.0, next_time - time.perf_counter()))
         except ConnectionResetError:
             logger.info("Plotter server disconnected.")
             is_running = False
 
 
-
 if __name__ == "__main__":
-    main()
+    logger_config.configure_logging()
+    main(parse_args())
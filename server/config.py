@@ -1,17 +1,69 @@
-from pydantic import BaseModel
-from typing import Optional
+from dataclasses import MISSING, dataclass, fields
+from typing import Literal, Optional, Union, get_args, get_origin
 from pathlib import Path
 import json
 
 
-class MouseServerConfig(BaseModel):
+@dataclass
+class MouseServerConfig:
+    """
+    Server settings. Plain dataclass checked on construction, importing pydantic would double headless start time.
+    """
     address: str
     mouse_speed: int
     plotter_address: Optional[str]
     plotter_authkey: Optional[str]
+    metrics_address: Optional[str] = None
+    staleness_threshold: float = 0.25
+
+    # Filter parameters used for clients in server-side filtering mode.
+    # Nominal sample interval, used until intervals between client timestamps are known.
+    filter_dt: float = 0.01
+    process_noise_var: float = 0.02
+    measurement_noise_var: float = 0.01
+    running_average_window: int = 5
+    inactivity_threshold: float = 0.4
+    inactivity_time: float = 0.01
+    filter_precision: Literal["float64", "float32"] = "float64"
+    # Pointer injection backend: "pynput", "uinput" (Linux, batched) or "stub" (no injection).
+    injection_backend: Literal["pynput", "uinput", "stub"] = "pynput"
+    # Worker processes serving clients, each owns a subset of connections. Injection stays in the main process.
+    workers: int = 1
+
+    def __post_init__(self):
+        for field in fields(self):
+            setattr(self, field.name, check_value(field.name, field.type, getattr(self, field.name)))
+        if self.workers < 1:
+            raise ValueError(f"workers must be at least 1, got {self.workers}")
 
     @classmethod
     def from_json(cls, path="config/settings.json") -> "MouseServerConfig":
         path = Path(path)
         data = json.loads(path.read_text())
-        return MouseServerConfig(**data)
+        # Unknown keys are ignored, so that settings of newer versions still load.
+        names = {field.name for field in fields(cls)}
+        missing = [field.name for field in fields(cls) if field.name not in data and field.default is MISSING]
+        if missing:
+            raise ValueError(f"{path}: missing settings {', '.join(missing)}")
+        return MouseServerConfig(**{key: value for key, value in data.items() if key in names})
+
+
+def check_value(name:str, expected, value):
+    """
+    Check that value matches annotation of the setting, ints are accepted for floats. Returns value to store.
+    """
+    origin = get_origin(expected)
+    if origin is Literal:
+        if value not in get_args(expected):
+            raise ValueError(f"{name} must be one of {', '.join(map(repr, get_args(expected)))}, got {value!r}")
+        return value
+    if origin is Union:
+        if value is None and type(None) in get_args(expected):
+            return value
+        expected = next(arg for arg in get_args(expected) if arg is not type(None))
+
+    if expected is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, expected) or isinstance(value, bool):
+        raise ValueError(f"{name} must be {expected.__name__}, got {value!r}")
+    return value
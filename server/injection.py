@@ -0,0 +1,179 @@
+"""
+Pointer injection backends used by MouseController.
+
+Backend receives relative moves and button edges and turns them into OS input events. Events may be collected
+and delivered together on flush(), which the server calls once per batch of coalesced commands.
+Button edges are delivered right away, they are latency critical and rare.
+"""
+import os
+import struct
+import sys
+
+import common.logger_config as logger_config
+logger = logger_config.get_logger(__name__)
+
+
+class InjectionBackend:
+    name = "abstract"
+
+    def move(self, dx:int, dy:int):
+        raise NotImplementedError()
+
+    def button(self, button:int, pressed:bool):
+        """
+        Press or release button 0 (left) or 1 (right).
+        """
+        raise NotImplementedError()
+
+    def flush(self):
+        """
+        Deliver events collected since previous flush.
+        """
+
+    def close(self):
+        pass
+
+
+class PynputBackend(InjectionBackend):
+    """
+    Cross-platform injection through pynput. Every call is a separate X11 / Win32 / Quartz round trip,
+    so there is nothing to batch.
+    """
+    name = "pynput"
+
+    def __init__(self):
+        from pynput.mouse import Button, Controller
+
+        self.mouse = Controller()
+        self.buttons = (Button.left, Button.right)
+
+    def move(self, dx:int, dy:int):
+        self.mouse.move(dx, dy)
+
+    def button(self, button:int, pressed:bool):
+        if pressed:
+            self.mouse.press(self.buttons[button])
+        else:
+            self.mouse.release(self.buttons[button])
+
+
+class UinputBackend(InjectionBackend):
+    """
+    Virtual mouse device created through Linux /dev/uinput, needs write access to it (e.g. `input` group).
+    Moves collected until flush are written as one event frame terminated by a single SYN_REPORT,
+    all pending frames in one write() call.
+    """
+    name = "uinput"
+
+    EV_SYN, EV_KEY, EV_REL = 0x00, 0x01, 0x02
+    SYN_REPORT = 0
+    REL_X, REL_Y = 0x00, 0x01
+    BTN_LEFT, BTN_RIGHT = 0x110, 0x111
+    BUS_VIRTUAL = 0x06
+
+    # ioctl request codes from linux/uinput.h.
+    UI_DEV_CREATE = 0x5501
+    UI_DEV_DESTROY = 0x5502
+    UI_DEV_SETUP = 0x405C5503
+    UI_SET_EVBIT = 0x40045564
+    UI_SET_KEYBIT = 0x40045565
+    UI_SET_RELBIT = 0x40045566
+
+    # struct input_event: struct timeval, __u16 type, __u16 code, __s32 value. Zero time is filled in by kernel.
+    EVENT = struct.Struct("@llHHi")
+    # struct uinput_setup: struct input_id, char name[UINPUT_MAX_NAME_SIZE], __u32 ff_effects_max.
+    SETUP = struct.Struct("@HHHH80sI")
+
+    def __init__(self, path:str = "/dev/uinput", device_name:str = "iMouse virtual pointer"):
+        if not sys.platform.startswith("linux"):
+            raise OSError("uinput injection backend is only available on Linux.")
+        import fcntl
+
+        self.ioctl = fcntl.ioctl
+        self.fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            self.create_device(device_name)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+        self.buttons = (self.BTN_LEFT, self.BTN_RIGHT)
+        self.syn = self.EVENT.pack(0, 0, self.EV_SYN, self.SYN_REPORT, 0)
+        self.pending = bytearray()
+        # Whether events were added after the last SYN_REPORT.
+        self.open_frame = False
+        self.writes = 0
+
+    def create_device(self, device_name:str):
+        self.ioctl(self.fd, self.UI_SET_EVBIT, self.EV_KEY)
+        self.ioctl(self.fd, self.UI_SET_EVBIT, self.EV_REL)
+        for code in (self.BTN_LEFT, self.BTN_RIGHT):
+            self.ioctl(self.fd, self.UI_SET_KEYBIT, code)
+        for code in (self.REL_X, self.REL_Y):
+            self.ioctl(self.fd, self.UI_SET_RELBIT, code)
+        setup = self.SETUP.pack(self.BUS_VIRTUAL, 0x1, 0x1, 1, device_name.encode()[:79], 0)
+        self.ioctl(self.fd, self.UI_DEV_SETUP, setup)
+        self.ioctl(self.fd, self.UI_DEV_CREATE)
+
+    def move(self, dx:int, dy:int):
+        if dx:
+            self.pending += self.EVENT.pack(0, 0, self.EV_REL, self.REL_X, dx)
+            self.open_frame = True
+        if dy:
+            self.pending += self.EVENT.pack(0, 0, self.EV_REL, self.REL_Y, dy)
+            self.open_frame = True
+
+    def button(self, button:int, pressed:bool):
+        # Motion collected so far is reported before the button edge, in the same write.
+        if self.open_frame:
+            self.pending += self.syn
+        self.pending += self.EVENT.pack(0, 0, self.EV_KEY, self.buttons[button], int(pressed))
+        self.pending += self.syn
+        self.open_frame = False
+        self.flush()
+
+    def flush(self):
+        if self.open_frame:
+            self.pending += self.syn
+            self.open_frame = False
+        if self.pending:
+            os.write(self.fd, self.pending)
+            self.writes += 1
+            self.pending.clear()
+
+    def close(self):
+        self.ioctl(self.fd, self.UI_DEV_DESTROY)
+        os.close(self.fd)
+
+
+class StubBackend(InjectionBackend):
+    """
+    Records injected events in memory instead of delivering them. Used for load testing and benchmarks.
+    """
+    name = "stub"
+
+    def __init__(self):
+        self.moves = 0
+        self.clicks = 0
+        self.flushes = 0
+        self.position = [0, 0]
+
+    def move(self, dx:int, dy:int):
+        self.moves += 1
+        self.position[0] += dx
+        self.position[1] += dy
+
+    def button(self, button:int, pressed:bool):
+        if pressed:
+            self.clicks += 1
+
+    def flush(self):
+        self.flushes += 1
+
+
+BACKENDS = {backend.name: backend for backend in (PynputBackend, UinputBackend, StubBackend)}
+
+
+def create_backend(name:str) -> InjectionBackend:
+    logger.info("Loading %s injection backend.", name)
+    return BACKENDS[name]()
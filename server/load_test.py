@@ -0,0 +1,332 @@
+"""
+Load generator and soak harness for the mouse server.
+
+Server side runs MouseServerApp with StubMouseController and periodically reports
+commands/sec, p50/p99 apply latency of coalesced commands, CPU usage and RSS of the server process.
+With --workers every worker process reports on its own, injection goes to the stub backend:
+
+    python load_test.py server --report-interval 10 --workers 4
+
+Client side spawns many simulated clients as asyncio tasks, which synthesize
+(or replay from a file with one Command json per line) command streams at given rate.
+Click events are sent separately and their latency is reported on its own:
+
+    python load_test.py clients --count 50 --rate 100 --duration 7200
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from common.command import ACK, ClickEvent, Command, FRAME_DELIMITER, Hello, MoveEncoder, encode_frame
+from config import MouseServerConfig
+from main import MouseController, MouseServerApp, StubMouseController
+from metrics import MetricsServer
+from common.network_utils import is_unix_address, parse_address
+
+import common.logger_config as logger_config
+logger = logger_config.get_logger(__name__)
+
+
+def get_rss_bytes() -> int:
+    """
+    Current resident set size of this process. Falls back to peak RSS where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class LatencyRecorder:
+    """
+    Collects latency samples and command counts between reports. Safe to use from multiple threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples:List[float] = []
+        self.count = 0
+
+    def record(self, latency:float):
+        with self.lock:
+            self.samples.append(latency)
+            self.count += 1
+
+    def take(self):
+        with self.lock:
+            samples, count = self.samples, self.count
+            self.samples, self.count = [], 0
+        return samples, count
+
+
+class Reporter:
+    """
+    Periodically logs throughput, latency percentiles, CPU usage and RSS.
+    """
+
+    def __init__(self, name:str, recorder:LatencyRecorder, interval:float, details:"Optional[Callable[[], str]]"=None):
+        self.name = name
+        self.recorder = recorder
+        self.interval = interval
+        self.details = details
+        self.start_time = time.perf_counter()
+        self.last_time = self.start_time
+        self.last_cpu = time.process_time()
+
+    def report(self):
+        now = time.perf_counter()
+        cpu = time.process_time()
+        samples, count = self.recorder.take()
+
+        elapsed = now - self.last_time
+        cpu_percent = 100.0 * (cpu - self.last_cpu) / elapsed if elapsed > 0 else 0.0
+        self.last_time, self.last_cpu = now, cpu
+
+        if samples:
+            p50, p99 = np.percentile(samples, [50, 99]) * 1e6
+        else:
+            p50 = p99 = 0.0
+
+        logger.info(
+            "[%s] t=%.0fs cmds/s=%.1f latency p50=%.1fus p99=%.1fus cpu=%.1f%% rss=%.1fMiB%s",
+            self.name, now - self.start_time, count / elapsed, p50, p99,
+            cpu_percent, get_rss_bytes() / 2**20, " " + self.details() if self.details else "",
+        )
+
+    def run_forever(self, stop_signal:threading.Event):
+        while not stop_signal.wait(self.interval):
+            self.report()
+
+
+class InstrumentedServerApp(MouseServerApp):
+    """
+    MouseServerApp which records time spent applying every controller command.
+    """
+
+    def __init__(self, server_config:MouseServerConfig, recorder:LatencyRecorder, controller=None):
+        controller = controller or StubMouseController(mouse_speed=server_config.mouse_speed)
+        super().__init__(server_config, None, controller)
+        self.recorder = recorder
+
+    def inject(self, cmd:Command):
+        start_time = time.perf_counter()
+        super().inject(cmd)
+        self.recorder.record(time.perf_counter() - start_time)
+
+
+def start_instrumented_app(
+        config:MouseServerConfig, args, stop_signal:threading.Event, name:str = "server",
+        controller:Optional[MouseController] = None) -> InstrumentedServerApp:
+    """
+    Create instrumented app and start its reporter thread.
+    """
+    recorder = LatencyRecorder()
+    app = InstrumentedServerApp(config, recorder, controller)
+
+    last_counts = [0, 0]
+
+    def details() -> str:
+        commands, reads = app.metrics.commands_received, app.metrics.socket_reads
+        ratio = (commands - last_counts[0]) / max(1, reads - last_counts[1])
+        last_counts[:] = commands, reads
+        return "cmds/read=%.2f" % ratio
+
+    reporter = Reporter(name, recorder, args.report_interval, details)
+    threading.Thread(target=reporter.run_forever, args=(stop_signal,), daemon=True).start()
+    return app
+
+
+def run_server(args, logging_listener:logger_config.Listener):
+    config = MouseServerConfig.from_json(args.config)
+    if args.address:
+        config.address = args.address
+
+    stop_signal = threading.Event()
+    if args.workers > 1:
+        from workers import run_workers
+
+        config.workers = args.workers
+        config.injection_backend = "stub"
+        config.metrics_address = args.metrics_address
+        run_workers(
+            config, logging_listener,
+            lambda config, index, controller: start_instrumented_app(
+                config, args, stop_signal, f"server/{index}", controller
+            ),
+        )
+        return
+
+    app = start_instrumented_app(config, args, stop_signal)
+    if args.metrics_address:
+        MetricsServer(parse_address(args.metrics_address), app.metrics).start()
+    try:
+        app.run_forever()
+    finally:
+        stop_signal.set()
+
+
+def load_replay(path:Optional[str]) -> Optional[List[str]]:
+    if not path:
+        return None
+    with open(path) as replay_file:
+        return [line.strip() for line in replay_file if line.strip()]
+
+
+def synthesize_command(encoder:MoveEncoder, t:float, server_filtering:bool=False) -> Command:
+    """
+    Generate command with circular motion.
+    In server filtering mode the matching raw acceleration is sent instead of the move.
+    """
+    move = [0.5 * math.sin(2.0 * t), 0.5 * math.cos(2.0 * t), 0.0]
+
+    if server_filtering:
+        return Command(
+            acceleration=[math.cos(2.0 * t), -math.sin(2.0 * t), 0.0],
+            timestamp=time.perf_counter(),
+        )
+
+    return Command(
+        move=encoder.encode(move),
+        scale=encoder.scale,
+        timestamp=time.perf_counter(),
+    )
+
+
+def is_click_step(step:int, click_interval:float, rate:float) -> bool:
+    if click_interval <= 0:
+        return False
+    if rate <= 0:
+        return step % 1000 == 999
+    return step % max(1, int(click_interval * rate)) == 0
+
+
+async def simulated_client(
+        index:int, args, recorder:LatencyRecorder, click_recorder:LatencyRecorder, replay:Optional[List[str]]):
+    address = parse_address(args.server)
+    if is_unix_address(address):
+        reader, writer = await asyncio.open_unix_connection(address)
+    else:
+        reader, writer = await asyncio.open_connection(*address)
+    hello = Hello(**json.loads(await reader.readline()))
+    logger.info("client %d connected, %s", index, hello)
+
+    encoder = MoveEncoder(args.move_scale)
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    start_time = time.perf_counter()
+    step = 0
+
+    # Up to `pipeline` frames are sent before their acknowledgements arrive.
+    window = asyncio.Semaphore(args.pipeline)
+    # (send time, recorder) of every frame waiting for acknowledgement.
+    in_flight = deque()
+
+    async def read_acks():
+        pending = 0
+        while True:
+            data = await reader.read(1024)
+            if not data:
+                logger.info("client %d disconnected by server", index)
+                return
+            pending += len(data)
+            while pending >= len(ACK):
+                pending -= len(ACK)
+                send_time, frame_recorder = in_flight.popleft()
+                frame_recorder.record(time.perf_counter() - send_time)
+                window.release()
+
+    ack_task = asyncio.create_task(read_acks())
+    try:
+        while time.perf_counter() - start_time < args.duration:
+            await window.acquire()
+            if ack_task.done():
+                break
+
+            if replay:
+                payload = replay[step % len(replay)].encode("utf-8") + FRAME_DELIMITER
+            else:
+                payload = encode_frame(synthesize_command(encoder, step * interval, args.server_filtering))
+
+            in_flight.append((time.perf_counter(), recorder))
+            writer.write(payload)
+            await writer.drain()
+
+            if not replay and is_click_step(step, args.click_interval, args.rate):
+                for pressed in (True, False):
+                    await window.acquire()
+                    in_flight.append((time.perf_counter(), click_recorder))
+                    writer.write(encode_frame(ClickEvent(button=0, pressed=pressed, timestamp=time.perf_counter())))
+                    await writer.drain()
+
+            step += 1
+            next_time = start_time + step * interval
+            await asyncio.sleep(max(0.0, next_time - time.perf_counter()))
+    finally:
+        ack_task.cancel()
+        writer.close()
+
+
+async def run_clients_async(args):
+    recorder = LatencyRecorder()
+    click_recorder = LatencyRecorder()
+    stop_signal = threading.Event()
+    reporters = [
+        Reporter("clients", recorder, args.report_interval),
+        Reporter("clicks", click_recorder, args.report_interval),
+    ]
+    for reporter in reporters:
+        threading.Thread(target=reporter.run_forever, args=(stop_signal,), daemon=True).start()
+
+    replay = load_replay(args.replay)
+    try:
+        await asyncio.gather(*[
+            simulated_client(index, args, recorder, click_recorder, replay) for index in range(args.count)
+        ])
+    finally:
+        stop_signal.set()
+        for reporter in reporters:
+            reporter.report()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mouse server load generator and soak harness.")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    server = subparsers.add_parser("server", help="Run server with stub controller and report metrics.")
+    server.add_argument("--config", default="config/settings.json")
+    server.add_argument("--address", help="Override listening address, e.g. localhost:5000 or unix:/tmp/imouse.sock")
+    server.add_argument("--report-interval", type=float, default=10.0)
+    server.add_argument("--metrics-address", help="Expose Prometheus metrics, e.g. localhost:9100")
+    server.add_argument("--workers", type=int, default=1, help="Worker processes sharing the address.")
+
+    clients = subparsers.add_parser("clients", help="Run simulated clients against local server.")
+    clients.add_argument("--server", default="localhost:5000", help="host:port or unix:/path/to/socket")
+    clients.add_argument("--count", type=int, default=10, help="Number of simulated clients.")
+    clients.add_argument("--rate", type=float, default=100.0, help="Commands per second per client, 0 sends as fast as possible.")
+    clients.add_argument("--pipeline", type=int, default=1, help="Commands sent ahead of their acknowledgement.")
+    clients.add_argument("--duration", type=float, default=60.0, help="Run time in seconds.")
+    clients.add_argument("--click-interval", type=float, default=5.0, help="Seconds between clicks, 0 disables.")
+    clients.add_argument("--move-scale", type=float, default=1000.0)
+    clients.add_argument("--server-filtering", action="store_true", help="Send raw acceleration instead of moves.")
+    clients.add_argument("--replay", help="File with one Command json per line to replay instead of synthesizing.")
+    clients.add_argument("--report-interval", type=float, default=10.0)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging_listener = logger_config.configure_logging()
+    args = parse_args()
+    if args.mode == "server":
+        run_server(args, logging_listener)
+    else:
+        asyncio.run(run_clients_async(args))
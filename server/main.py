@@ -2,117 +2,491 @@
 Mouse Server (Must be running on the device which will be controlled using the app).
 """
 import sys
+import selectors
 import signal
 import socket
+import time
 
-from multiprocessing import Queue
-from multiprocessing.managers import BaseManager
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple, Union
 
-from pynput.mouse import Button, Controller
-from typing import Optional
-
-from common.command import Command
+from common.command import (
+    ACK, ClickEvent, Command, FrameReader, FrameTooLargeError, Hello, PlotFrame, decode_message, encode_frame
+)
 from config import MouseServerConfig
+from injection import InjectionBackend, create_backend
+from metrics import ServerMetrics
+
+from common.network_utils import parse_address, configure_low_latency, create_listener, format_peer
 
-from common.network_utils import parse_address
+if TYPE_CHECKING:
+    from multiprocessing import Queue
 import common.logger_config as logger_config
 logger = logger_config.get_logger(__name__)
-
-
-class QueueManager(BaseManager):
-    pass
+# Logs every injected click.
+click_logger = logger_config.get_logger(f"{__name__}.click", logger_config.Throttle(rate=20.0))
 
 
 class MouseController:
+    """
+    Applies commands through an injection backend. Moves are delivered on flush(), button edges right away.
+    """
 
-    def __init__(self, mouse_speed):
-        self.mouse = Controller()
+    def __init__(self, mouse_speed, backend:str = "pynput"):
+        # Injection backend is loaded on the first command, so that headless server starts fast.
+        self.backend_name = backend
+        self.backend:"Optional[InjectionBackend]" = None
         self.mouse_speed = mouse_speed
 
+    def load_backend(self):
+        self.backend = create_backend(self.backend_name)
+
     def apply_command(self, command: Command):
+        if self.backend is None:
+            self.load_backend()
+
         if command.click:
             if command.click[0]:
-                logger.debug("lmb click")
-                self.mouse.click(Button.left)
+                click_logger.debug("lmb click")
+                self.click(0)
 
             elif command.click[1]:
-                logger.debug("rmb click")
-                self.mouse.click(Button.right)
+                click_logger.debug("rmb click")
+                self.click(1)
+
+        move = command.get_move()
+        dx = int(move[0] * self.mouse_speed)
+        dy = int(move[1] * self.mouse_speed)
+
+        self.backend.move(dx, -dy)
+
+    def click(self, button:int):
+        self.backend.button(button, True)
+        self.backend.button(button, False)
+
+    def apply_button(self, button:int, pressed:bool):
+        if self.backend is None:
+            self.load_backend()
+
+        click_logger.debug("button %d %s", button, "press" if pressed else "release")
+        self.backend.button(button, pressed)
+
+    def flush(self):
+        if self.backend is not None:
+            self.backend.flush()
+
+
+class StubMouseController(MouseController):
+    """
+    Controller which only records commands instead of injecting them. Used for load testing.
+    """
 
-        dx = int(command.move[0] * self.mouse_speed)
-        dy = int(command.move[1] * self.mouse_speed)
+    def __init__(self, mouse_speed):
+        super().__init__(mouse_speed, backend="stub")
 
-        self.mouse.move(dx, -dy)
+
+class OutputBacklogError(Exception):
+    pass
 
 
 class MouseServerApp:
+    MAX_BATCH_SIZE = 256
+    # Unsent bytes kept for a client which does not read its acknowledgements, connection is closed beyond that.
+    MAX_OUTPUT_BACKLOG = 64 * 1024
+    # Rate [s/s] at which delay baseline of a connection rises back, so that it follows clock drift of the client.
+    BASELINE_DRIFT_RATE = 1e-3
 
-    def __init__(self, server_config: MouseServerConfig, plotter_data_queue: Queue):
+    def __init__(self, server_config: MouseServerConfig, plotter_data_queue: "Optional[Queue]", controller=None):
         """
         Initialize server instance.
         """
         self.config = server_config
-        self.controller = MouseController(mouse_speed=server_config.mouse_speed)
+        self.controller = controller or MouseController(server_config.mouse_speed, server_config.injection_backend)
         self.is_running = False
         self.plotter_data_queue = plotter_data_queue
+        self.connections = set()
+        self.readers:Dict[socket.socket, FrameReader] = {}
+        # Bytes the socket did not take yet, sent once it becomes writable.
+        self.outgoing:Dict[socket.socket, bytearray] = {}
+        # Buttons held down by each client, released if the client disconnects.
+        self.pressed_buttons:Dict[socket.socket, Set[int]] = {}
+        self.pending_commands:List[Tuple[socket.socket, Command, float]] = []
+        # [baseline delay, time of its last update] of each connection.
+        self.delay_baselines:Dict[socket.socket, List[float]] = {}
+
+        # Plot rows are collected per client and published as one block per loop iteration.
+        self.plot_sources:Dict[socket.socket, str] = {}
+        self.pending_plot_rows:Dict[str, List[List[float]]] = {}
+
+        # Filter state of clients running in server-side filtering mode, created on first use.
+        self.estimator_bank = None
+        self.filter_slots:Dict[socket.socket, int] = {}
+        # Timestamp of the previous filtered sample of each client, samples are integrated over client-side intervals.
+        self.filter_timestamps:Dict[socket.socket, float] = {}
+
+        self.metrics = ServerMetrics()
+        self.metrics.register_gauge(
+            "mouse_server_connected_clients", "Number of connected clients.", lambda: len(self.connections)
+        )
+        if self.plotter_data_queue:
+            self.metrics.register_gauge(
+                "mouse_server_plot_queue_depth", "Number of plot blocks waiting in plotter queue.",
+                self.plotter_data_queue.qsize
+            )
 
-    def run_forever(self):
+    def run_forever(self, listener:Optional[socket.socket] = None):
         """
-        Run server in a forever loop.
+        Listen on a single long-lived socket and serve all connected clients until stopped.
+        Listener is created from configured address unless given.
         """
-        while True:
-            app.run()
+        if listener is None:
+            listener = create_listener(parse_address(self.config.address))
+        with listener:
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(listener, selectors.EVENT_READ, self.accept_connection)
+            logger.info("Server is running, waiting for connections...")
+
+            self.is_running = True
+            try:
+                while self.is_running:
+                    self.run()
+            finally:
+                for connection in list(self.connections):
+                    self.close_connection(connection)
+                self.selector.close()
 
     def run(self):
         """
-        Wait for client connection and run processing until disconnected.
+        Wait for socket events, drain every command already available and apply them as a batch.
         """
-        logger.info("Server is running.")
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-            try:
-                connection = self.wait_for_connection(server_socket)
-            except socket.timeout:
-                return
+        self.dispatch_events(timeout=1.0)
+        while self.pending_commands and len(self.pending_commands) < self.MAX_BATCH_SIZE:
+            if not self.dispatch_events(timeout=0):
+                break
 
-            self.is_running = True
-            while self.is_running:
-                try:
-                    self.step(connection)
-                except Exception as e:
-                    logger.exception(
-                        "Server encountered an error while executing step function."
-                    )
-                    self.is_running = False
+        if self.pending_commands:
+            self.apply_pending_commands()
+        if self.pending_plot_rows:
+            self.flush_plot_rows()
+
+    def dispatch_events(self, timeout:float) -> int:
+        """
+        Dispatch socket events to their handlers. Returns number of events.
+        """
+        events = self.selector.select(timeout=timeout)
+        for key, mask in events:
+            handler = key.data
+            handler(key.fileobj, mask)
+        return len(events)
+
+    def accept_connection(self, listener:socket.socket, mask:int):
+        """
+        Accept pending client connection and start serving it.
+        Connections stay non-blocking, so that a client which stops reading cannot stall the others.
+        """
+        try:
+            connection, address = listener.accept()
+        except BlockingIOError:
+            return
+        connection.setblocking(False)
+        configure_low_latency(connection)
+        logger.info("Connection accepted from %s", format_peer(address, connection))
+
+        self.connections.add(connection)
+        self.readers[connection] = FrameReader(connection)
+        self.plot_sources[connection] = format_peer(address, connection)
+        self.selector.register(connection, selectors.EVENT_READ, self.handle_connection)
+        try:
+            self.send_output(connection, encode_frame(Hello(plotter=self.plotter_data_queue is not None)))
+        except OSError:
+            logger.info("Client disconnected.")
+            self.close_connection(connection)
+
+    def handle_connection(self, connection:socket.socket, mask:int):
+        """
+        Process commands from client connection which became readable, send queued output if it became writable.
+        """
+        if connection not in self.connections:
+            # Closed while handling an earlier event of the same select call.
+            return
+        try:
+            if mask & selectors.EVENT_WRITE:
+                self.flush_output(connection)
+            if mask & selectors.EVENT_READ:
+                self.step(connection)
+        except BlockingIOError:
+            pass
+        except (ConnectionError, TimeoutError):
+            logger.info("Client disconnected.")
+            self.close_connection(connection)
+        except (FrameTooLargeError, OutputBacklogError) as e:
+            logger.warning("Closing connection from %s: %s", self.plot_sources.get(connection, "unknown"), e)
+            self.close_connection(connection)
+        except Exception as e:
+            logger.exception(
+                "Server encountered an error while executing step function."
+            )
+            self.close_connection(connection)
+
+    def close_connection(self, connection:socket.socket):
+        self.selector.unregister(connection)
+        self.connections.discard(connection)
+        self.readers.pop(connection, None)
+        self.outgoing.pop(connection, None)
+        for button in self.pressed_buttons.pop(connection, ()):
+            self.inject_button(ClickEvent(button=button, pressed=False))
+        self.delay_baselines.pop(connection, None)
+        self.plot_sources.pop(connection, None)
+        if connection in self.filter_slots:
+            self.estimator_bank.remove_client(self.filter_slots.pop(connection))
+        self.filter_timestamps.pop(connection, None)
+        connection.close()
 
     def step(self, connection:socket.socket):
         """
-        Wait for next command and apply it.
-        If plotter service was connected send data.
+        Receive all messages available on connection and acknowledge them with a single send.
+        Commands are queued for application, plot frames are forwarded to plotter.
         """
-        cmd = Command.recv(connection)
-        if self.plotter_data_queue:
-            self.plotter_data_queue.put(cmd.plot_data)
-        self.controller.apply_command(cmd)
+        start_time = time.perf_counter()
+        frames = self.readers[connection].read()
+        self.metrics.socket_reads += 1
+        if frames:
+            self.send_output(connection, ACK * len(frames))
+
+        for frame in frames:
+            message = decode_message(frame)
+            if isinstance(message, PlotFrame):
+                self.publish_plot_rows(connection, message.rows)
+            elif isinstance(message, ClickEvent):
+                self.handle_click(connection, message, start_time)
+            else:
+                self.pending_commands.append((connection, message, self.measure_staleness(connection, message)))
+        self.metrics.decode_time.record(time.perf_counter() - start_time)
+
+    def send_output(self, connection:socket.socket, data:bytes):
+        """
+        Send without blocking. Bytes the socket does not take are kept and sent when it becomes writable.
+        """
+        pending = self.outgoing.get(connection)
+        if pending is not None:
+            pending += data
+            if len(pending) > self.MAX_OUTPUT_BACKLOG:
+                raise OutputBacklogError(f"More than {self.MAX_OUTPUT_BACKLOG} bytes of output not read by client.")
+            return
+
+        try:
+            sent = connection.send(data)
+        except BlockingIOError:
+            sent = 0
+        if sent < len(data):
+            self.outgoing[connection] = bytearray(data[sent:])
+            self.selector.modify(connection, selectors.EVENT_READ | selectors.EVENT_WRITE, self.handle_connection)
+
+    def flush_output(self, connection:socket.socket):
+        pending = self.outgoing[connection]
+        del pending[:connection.send(pending)]
+        if not pending:
+            del self.outgoing[connection]
+            self.selector.modify(connection, selectors.EVENT_READ, self.handle_connection)
+
+    def handle_click(self, connection:socket.socket, event:ClickEvent, receive_time:float):
+        """
+        Inject button edge right away instead of waiting for the batch. Moves received before it are applied first,
+        so that the click lands at the right position.
+        """
+        if self.pending_commands:
+            self.apply_pending_commands()
+
+        self.metrics.click_delay.record(self.measure_staleness(connection, event))
+        pressed_buttons = self.pressed_buttons.setdefault(connection, set())
+        if event.pressed:
+            pressed_buttons.add(event.button)
+        else:
+            pressed_buttons.discard(event.button)
+
+        self.inject_button(event)
+        self.metrics.click_latency.record(time.perf_counter() - receive_time)
 
-    def wait_for_connection(self, server_socket:socket.socket) -> socket.socket:
+    def measure_staleness(self, connection:socket.socket, cmd:"Union[Command, ClickEvent]") -> float:
+        """
+        Estimate how late command arrived compared to the fastest delivery seen on this connection.
+        Client and server clocks differ by an offset which cancels out. The offset drifts slowly, so the baseline
+        is a minimum which rises by BASELINE_DRIFT_RATE over time, clocks running apart by up to that rate are followed.
+        """
+        if cmd.timestamp is None:
+            return 0.0
+
+        now = time.perf_counter()
+        delay = now - cmd.timestamp
+        entry = self.delay_baselines.get(connection)
+        if entry is None:
+            self.delay_baselines[connection] = [delay, now]
+            return 0.0
+
+        baseline = entry[0] + (now - entry[1]) * self.BASELINE_DRIFT_RATE
+        entry[1] = now
+        if delay < baseline:
+            entry[0] = delay
+            return 0.0
+        entry[0] = baseline
+        return delay - baseline
+
+    def filter_commands(self, commands:"List[Tuple[socket.socket, Command, float]]"):
         """
-        Waits for a client connection. Returns connection socket.
+        Compute moves for commands carrying raw acceleration using the shared estimator bank.
+        Each round updates every client which has a sample in it with a single numpy step,
+        so that multiple samples from one client are applied in order. Samples are integrated over intervals
+        between client timestamps, nominal filter_dt is used only for the first sample or without timestamps.
         """
-        server_socket.settimeout(5.0)
-        server_socket.bind(parse_address(self.config.address))
-        server_socket.listen()
+        rounds:List[Tuple[List[int], List[Command], List[float]]] = []
+        round_index:Dict[socket.socket, int] = {}
+
+        for connection, cmd, _ in commands:
+            if cmd.acceleration is None:
+                continue
+            if self.estimator_bank is None:
+                self.estimator_bank = self.create_estimator_bank()
+            if connection not in self.filter_slots:
+                self.filter_slots[connection] = self.estimator_bank.add_client()
+
+            index = round_index.get(connection, 0)
+            round_index[connection] = index + 1
+            if index == len(rounds):
+                rounds.append(([], [], []))
+            rounds[index][0].append(self.filter_slots[connection])
+            rounds[index][1].append(cmd)
+            rounds[index][2].append(self.sample_interval(connection, cmd))
+
+        for slots, round_commands, intervals in rounds:
+            velocities = self.estimator_bank.apply(slots, [cmd.acceleration for cmd in round_commands], intervals)
+            for cmd, velocity in zip(round_commands, velocities.tolist()):
+                cmd.move = velocity if cmd.speed is None else [value * cmd.speed for value in velocity]
+                cmd.scale = None
+
+    def sample_interval(self, connection:socket.socket, cmd:Command) -> float:
+        """
+        Time since previous filtered sample of the client, by client clock.
+        """
+        if cmd.timestamp is None:
+            return self.config.filter_dt
+        previous = self.filter_timestamps.get(connection)
+        self.filter_timestamps[connection] = cmd.timestamp
+        return self.config.filter_dt if previous is None else cmd.timestamp - previous
+
+    def create_estimator_bank(self):
+        from common.math import PRECISIONS, VelocityEstimatorBank
+
+        return VelocityEstimatorBank(
+            dt=self.config.filter_dt,
+            process_noise_var=self.config.process_noise_var,
+            measurement_noise_var=self.config.measurement_noise_var,
+            inactivity_threshold=self.config.inactivity_threshold,
+            inactivity_time_threshold=self.config.inactivity_time,
+            running_average_window=self.config.running_average_window,
+            dtype=PRECISIONS[self.config.filter_precision],
+        )
 
-        logger.info("Server waiting for connection...")
-        connection, address = server_socket.accept()
-        logger.info("Connection accepted from %s", address)
+    def apply_pending_commands(self):
+        """
+        Sum moves of all pending commands into as few controller calls as possible.
+        Moves older than staleness threshold are discarded, clicks are always applied in order.
+        """
+        commands, self.pending_commands = self.pending_commands, []
+        self.filter_commands(commands)
+        move = [0.0, 0.0, 0.0]
+        injections = 0
+
+        for connection, cmd, staleness in commands:
+            self.process_command(connection, cmd)
+
+            cmd_move = cmd.get_move()
+            if staleness > self.config.staleness_threshold:
+                self.metrics.stale_moves_dropped += 1
+                cmd_move = [0.0, 0.0, 0.0]
+
+            if cmd.click and any(cmd.click):
+                # Flush motion preceding the click so it lands at the right position.
+                if any(move):
+                    self.inject(Command(move=move, click=[False, False]))
+                    injections += 1
+                    move = [0.0, 0.0, 0.0]
+                self.inject(Command(move=cmd_move, click=cmd.click))
+                injections += 1
+            else:
+                move = [total + value for total, value in zip(move, cmd_move)]
+
+        if any(move):
+            self.inject(Command(move=move, click=[False, False]))
+            injections += 1
+
+        start_time = time.perf_counter()
+        self.controller.flush()
+        self.metrics.flush_time.record(time.perf_counter() - start_time)
+
+        self.metrics.commands_coalesced += max(0, len(commands) - injections)
+
+    def process_command(self, connection:socket.socket, cmd:Command):
+        """
+        Account received command and forward its plot data if present.
+        """
+        self.metrics.commands_received += 1
+        if cmd.telemetry:
+            logger.info("Client telemetry: %s", cmd.telemetry)
+        if cmd.plot_data:
+            self.publish_plot_rows(connection, [cmd.plot_data])
 
-        return connection
+    def publish_plot_rows(self, connection:socket.socket, rows:"List[List[float]]"):
+        """
+        Queue plot rows of the client for the plotter service if connected.
+        """
+        if not self.plotter_data_queue:
+            self.metrics.dropped_frames += len(rows)
+            return
 
+        source = self.plot_sources.get(connection, "unknown")
+        self.pending_plot_rows.setdefault(source, []).extend(rows)
 
-def try_connect_plotter(config:MouseServerConfig) -> Optional[Queue]:
+    def flush_plot_rows(self):
+        """
+        Publish collected plot rows to plotter as one block per client.
+        """
+        # Imported here, numpy is only needed when plotter is connected.
+        import numpy as np
+        from common.plot_block import PlotBlock
+
+        pending_rows, self.pending_plot_rows = self.pending_plot_rows, {}
+        start_time = time.perf_counter()
+        for source, rows in pending_rows.items():
+            try:
+                self.plotter_data_queue.put(PlotBlock(source, None, np.array(rows, dtype=float)).encode())
+            except Exception:
+                self.metrics.dropped_frames += len(rows)
+        self.metrics.plot_publish_time.record(time.perf_counter() - start_time)
+
+    def inject(self, cmd:Command):
+        """
+        Apply command with the mouse controller.
+        """
+        start_time = time.perf_counter()
+        self.controller.apply_command(cmd)
+        self.metrics.apply_time.record(time.perf_counter() - start_time)
+
+    def inject_button(self, event:ClickEvent):
+        """
+        Press or release button with the mouse controller.
+        """
+        self.metrics.click_events += 1
+        self.controller.apply_button(event.button, event.pressed)
+
+
+def try_connect_plotter(config:MouseServerConfig) -> "Optional[Queue]":
     """
     Attempt to connect to plotter service. If successful, returns Queue which can be used to feed data to it.
     """
+    from multiprocessing.managers import BaseManager
+
+    class QueueManager(BaseManager):
+        pass
+
     try:
         QueueManager.register("get_queue")
         queue_manager = QueueManager(
@@ -126,13 +500,23 @@ def try_connect_plotter(config:MouseServerConfig) -> Optional[Queue]:
         plotter_data_queue = queue_manager.get_queue()
         return plotter_data_queue
 
-    except ConnectionRefusedError:
-        logger.info("Could not connect to plotter service.")
+    except OSError as e:
+        # Refused TCP connection, or missing socket file of a Unix domain socket address.
+        logger.info("Could not connect to plotter service: %s", e)
         return None
 
 
+def parse_args():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="iMouse server.")
+    parser.add_argument("--config", default="config/settings.json")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    config = MouseServerConfig.from_json()
+    logging_listener = logger_config.configure_logging()
+    config = MouseServerConfig.from_json(parse_args().config)
     logger.info(str(config))
 
     def signal_handler(sig, frame):
@@ -140,7 +524,14 @@ if __name__ == "__main__":
         sys.exit(0)
     signal.signal(signal.SIGINT, signal_handler)
 
-    plotter_data_queue = try_connect_plotter(config)
-    app = MouseServerApp(config, plotter_data_queue)
-    app.run_forever()
+    if config.workers > 1:
+        from workers import run_workers
+        run_workers(config, logging_listener)
+    else:
+        plotter_data_queue = try_connect_plotter(config) if config.plotter_address else None
+        app = MouseServerApp(config, plotter_data_queue)
+        if config.metrics_address:
+            from metrics import MetricsServer
+            MetricsServer(parse_address(config.metrics_address), app.metrics).start()
+        app.run_forever()
 
@@ -0,0 +1,177 @@
+"""
+Server metrics collection and Prometheus text exposition over local HTTP endpoint.
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from common.profiler import Histogram
+
+import common.logger_config as logger_config
+logger = logger_config.get_logger(__name__)
+
+
+def format_histogram(name:str, description:str, histogram:Histogram) -> List[str]:
+    lines = [
+        f"# HELP {name} {description}",
+        f"# TYPE {name} histogram",
+    ]
+    cumulative = 0
+    for bound, bucket in zip(histogram.bounds, histogram.buckets):
+        cumulative += bucket
+        lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum {histogram.total}")
+    lines.append(f"{name}_count {histogram.count}")
+    return lines
+
+
+def format_value(name:str, description:str, kind:str, value:float) -> List[str]:
+    return [
+        f"# HELP {name} {description}",
+        f"# TYPE {name} {kind}",
+        f"{name} {value}",
+    ]
+
+
+class ServerMetrics:
+    """
+    Counters and histograms updated from the server loop.
+
+    Updates are plain attribute increments without locks, exposition only reads them,
+    so a scrape may see a histogram mid-update but never blocks the hot path.
+    """
+
+    def __init__(self):
+        self.commands_received = 0
+        self.dropped_frames = 0
+        self.commands_coalesced = 0
+        self.stale_moves_dropped = 0
+        self.socket_reads = 0
+        self.click_events = 0
+        self.decode_time = Histogram()
+        self.apply_time = Histogram()
+        self.flush_time = Histogram()
+        self.plot_publish_time = Histogram()
+        # Click path is measured separately from batched moves.
+        self.click_latency = Histogram()
+        self.click_delay = Histogram()
+
+        # Gauges evaluated at scrape time.
+        self.gauges:Dict[str, Tuple[str, Callable[[], float]]] = {}
+
+        self.last_scrape_time = time.perf_counter()
+        self.last_scrape_commands = 0
+
+    def register_gauge(self, name:str, description:str, getter:"Callable[[], float]"):
+        self.gauges[name] = (description, getter)
+
+    def commands_per_second(self) -> float:
+        """
+        Command rate since previous scrape.
+        """
+        now = time.perf_counter()
+        commands = self.commands_received
+        elapsed = now - self.last_scrape_time
+        rate = (commands - self.last_scrape_commands) / elapsed if elapsed > 0 else 0.0
+        self.last_scrape_time, self.last_scrape_commands = now, commands
+        return rate
+
+    def render(self) -> str:
+        lines = []
+        lines += format_value(
+            "mouse_server_commands_received_total", "Commands received from all clients.",
+            "counter", self.commands_received
+        )
+        lines += format_value(
+            "mouse_server_commands_per_second", "Commands received per second since previous scrape.",
+            "gauge", self.commands_per_second()
+        )
+        lines += format_value(
+            "mouse_server_dropped_frames_total", "Plot frames which could not be published.",
+            "counter", self.dropped_frames
+        )
+        lines += format_value(
+            "mouse_server_commands_coalesced_total", "Commands merged into another controller call.",
+            "counter", self.commands_coalesced
+        )
+        lines += format_value(
+            "mouse_server_stale_moves_dropped_total", "Moves discarded for exceeding staleness threshold.",
+            "counter", self.stale_moves_dropped
+        )
+        lines += format_value(
+            "mouse_server_click_events_total", "Button press and release events injected.",
+            "counter", self.click_events
+        )
+        lines += format_value(
+            "mouse_server_socket_reads_total", "Socket reads of client data, each may carry several messages.",
+            "counter", self.socket_reads
+        )
+        lines += format_histogram(
+            "mouse_server_decode_seconds", "Time spent receiving and decoding messages of a single socket read.",
+            self.decode_time
+        )
+        lines += format_histogram(
+            "mouse_server_apply_seconds", "Time spent in apply_command.", self.apply_time
+        )
+        lines += format_histogram(
+            "mouse_server_inject_flush_seconds", "Time spent delivering injected events of a batch.", self.flush_time
+        )
+        lines += format_histogram(
+            "mouse_server_plot_publish_seconds", "Time spent publishing plot data.", self.plot_publish_time
+        )
+        lines += format_histogram(
+            "mouse_server_click_inject_seconds", "Time from receiving button event until it was injected.",
+            self.click_latency
+        )
+        lines += format_histogram(
+            "mouse_server_click_delay_seconds", "Button event network delay above the fastest delivery seen on its connection.",
+            self.click_delay
+        )
+        for name, (description, getter) in self.gauges.items():
+            try:
+                value = getter()
+            except Exception:
+                continue
+            lines += format_value(name, description, "gauge", value)
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves metrics on /metrics endpoint from a background thread.
+    """
+
+    def __init__(self, address:"Tuple[str, int]", metrics:ServerMetrics):
+        # Imported here, so that http stack is only loaded when metrics endpoint is enabled.
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics_ref = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics_ref.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.http_server = ThreadingHTTPServer(address, Handler)
+        self.http_server.daemon_threads = True
+        self.thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+
+    def start(self):
+        logger.info("Serving metrics on http://%s:%d/metrics", *self.http_server.server_address[:2])
+        self.thread.start()
+
+    def stop(self):
+        self.http_server.shutdown()
+        self.http_server.server_close()
@@ -0,0 +1,203 @@
+"""
+Sharded server mode: pre-forked worker processes serve clients, the main process injects.
+
+Each worker runs its own MouseServerApp over a subset of connections, so frame decoding and filtering of
+different clients run on different cores. Where available, connections are balanced by kernel between
+per-worker listeners bound with SO_REUSEPORT, otherwise (Unix domain socket address) workers accept
+from one listener created before fork.
+Moves and button edges are sent by workers through a single pipe to the main process, which applies them
+with the injection backend in the order they arrive.
+"""
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+from typing import Callable, List, Optional, Set
+
+from common.network_utils import create_listener, parse_address, supports_reuse_port
+from config import MouseServerConfig
+from injection import InjectionBackend, create_backend
+from main import MouseController, MouseServerApp, try_connect_plotter
+
+import common.logger_config as logger_config
+logger = logger_config.get_logger(__name__)
+
+# Injection event: type, then dx, dy of a move or button, pressed of a button edge.
+EVENT = struct.Struct("=Bii")
+MOVE, BUTTON = 0, 1
+# Pipe writes of up to PIPE_BUF bytes are atomic, so batches of different workers never interleave.
+MAX_WRITE = select.PIPE_BUF // EVENT.size * EVENT.size
+READ_SIZE = 64 * MAX_WRITE
+
+# Creates server app of a worker from config, worker index and controller injecting through the channel.
+AppFactory = Callable[[MouseServerConfig, int, MouseController], MouseServerApp]
+
+
+class ChannelBackend(InjectionBackend):
+    """
+    Worker side of the injection channel. Events collected until flush are written with as few atomic
+    writes as possible, button edges are written right away.
+    """
+    name = "channel"
+
+    def __init__(self, fd:int):
+        self.fd = fd
+        self.pending = bytearray()
+
+    def move(self, dx:int, dy:int):
+        if dx or dy:
+            self.pending += EVENT.pack(MOVE, dx, dy)
+
+    def button(self, button:int, pressed:bool):
+        self.pending += EVENT.pack(BUTTON, button, int(pressed))
+        self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        for start in range(0, len(self.pending), MAX_WRITE):
+            os.write(self.fd, self.pending[start:start + MAX_WRITE])
+        self.pending.clear()
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Injector:
+    """
+    Main process side of the injection channel. Applies events of all workers in order until every worker
+    closed its end, then releases buttons left pressed by workers which exited abnormally.
+    """
+
+    def __init__(self, fd:int, backend:InjectionBackend):
+        self.fd = fd
+        self.backend = backend
+        self.pressed:Set[int] = set()
+
+    def run(self):
+        remainder = b""
+        while True:
+            data = os.read(self.fd, READ_SIZE)
+            if not data:
+                break
+
+            # Reads hold whole events since every write does, remainder is kept only to be safe.
+            data = remainder + data
+            end = len(data) - len(data) % EVENT.size
+            remainder = data[end:]
+            self.apply(data[:end] if remainder else data)
+
+        for button in list(self.pressed):
+            self.apply(EVENT.pack(BUTTON, button, 0))
+
+    def apply(self, data:bytes):
+        backend = self.backend
+        for kind, first, second in EVENT.iter_unpack(data):
+            if kind == MOVE:
+                backend.move(first, second)
+            else:
+                backend.button(first, bool(second))
+                if second:
+                    self.pressed.add(first)
+                else:
+                    self.pressed.discard(first)
+        backend.flush()
+
+    def close(self):
+        os.close(self.fd)
+        self.backend.close()
+
+
+def create_app(config:MouseServerConfig, index:int, controller:MouseController) -> MouseServerApp:
+    plotter_data_queue = try_connect_plotter(config) if config.plotter_address else None
+    return MouseServerApp(config, plotter_data_queue, controller)
+
+
+def run_worker(
+        config:MouseServerConfig, index:int, listener:Optional[socket.socket], channel_fd:int,
+        logging_listener:logger_config.Listener, app_factory:AppFactory):
+    """
+    Entry point of a forked worker process.
+    """
+    logging_listener.start()
+
+    def signal_handler(sig, frame):
+        sys.exit(0)
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    try:
+        if listener is None:
+            listener = create_listener(parse_address(config.address), reuse_port=True)
+        controller = MouseController(config.mouse_speed)
+        controller.backend = ChannelBackend(channel_fd)
+        logger.info("Worker %d started, pid %d.", index, os.getpid())
+        # Connections are closed when app stops, so buttons they hold are released through the channel.
+        app_factory(config, index, controller).run_forever(listener)
+    finally:
+        logging_listener.stop()
+
+
+def run_workers(
+        config:MouseServerConfig, logging_listener:logger_config.Listener, app_factory:AppFactory = create_app):
+    """
+    Fork `config.workers` worker processes and inject their events until all of them exit.
+    SIGINT or SIGTERM stops the workers.
+    """
+    if not hasattr(os, "fork"):
+        raise OSError("Multiple workers need os.fork, set workers to 1 on this platform.")
+    if config.metrics_address:
+        logger.warning("Metrics are served per process and are disabled with multiple workers.")
+    # Loaded before fork rather than on the first event, so that a backend which cannot be loaded stops
+    # the server at startup instead of after workers accepted clients.
+    backend = create_backend(config.injection_backend)
+
+    address = parse_address(config.address)
+    listener = None if supports_reuse_port(address) else create_listener(address)
+    logger.info(
+        "Starting %d workers, %s.", config.workers,
+        "each with own listener (SO_REUSEPORT)" if listener is None else "accepting from shared listener",
+    )
+
+    read_fd, write_fd = os.pipe()
+    context = multiprocessing.get_context("fork")
+    processes:List[multiprocessing.Process] = [
+        context.Process(
+            target=run_worker, name=f"worker-{index}",
+            args=(config, index, listener, write_fd, logging_listener, app_factory),
+        )
+        for index in range(config.workers)
+    ]
+    # Logging thread is stopped while forking, a lock it holds would stay locked in workers forever.
+    logging_listener.stop()
+    for process in processes:
+        process.start()
+    logging_listener.start()
+
+    # Channel reaches end of file once the last worker exits.
+    os.close(write_fd)
+    if listener is not None:
+        listener.close()
+
+    def signal_handler(sig, frame):
+        logger.info("Signal received, stopping workers...")
+        for process in processes:
+            process.terminate()
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    injector = Injector(read_fd, backend)
+    try:
+        injector.run()
+    finally:
+        # Workers have exited unless injection failed, then nothing would stop them.
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+            if process.exitcode:
+                logger.warning("%s exited with code %d.", process.name, process.exitcode)
+        injector.close()
@@ -0,0 +1,67 @@
+"""
+Reports logging calls which format their message eagerly.
+
+Message passed to logger.info(...) and similar calls must be a plain string with arguments passed separately,
+so that records dropped by level, sampling or rate limits cost no formatting on the calling thread.
+Flags f-strings, str.format() calls, % and + on the message argument.
+
+    python -m tools.check_logging client server plotter common
+"""
+import argparse
+import ast
+from pathlib import Path
+from typing import Iterator, Tuple
+
+LOG_METHODS = {"debug", "info", "warning", "error", "exception", "critical", "log"}
+LOGGER_NAMES = {"logger", "log", "Logger"}
+
+
+def is_logger(node:ast.expr) -> bool:
+    """
+    Matches `logger`, `Logger`, `self.logger` and names ending with `_logger`.
+    """
+    name = node.attr if isinstance(node, ast.Attribute) else getattr(node, "id", "")
+    return name in LOGGER_NAMES or name.endswith("_logger")
+
+
+def is_eager(message:ast.expr) -> bool:
+    if isinstance(message, ast.JoinedStr):
+        return any(isinstance(value, ast.FormattedValue) for value in message.values)
+    if isinstance(message, ast.Call) and isinstance(message.func, ast.Attribute):
+        return message.func.attr == "format"
+    if isinstance(message, ast.BinOp):
+        return isinstance(message.op, (ast.Mod, ast.Add))
+    return False
+
+
+def eager_calls(path:Path) -> "Iterator[Tuple[int, str]]":
+    source = path.read_text()
+    for node in ast.walk(ast.parse(source, str(path))):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+            continue
+        if node.func.attr not in LOG_METHODS or not is_logger(node.func.value):
+            continue
+        # Level is the first argument of logger.log().
+        position = 1 if node.func.attr == "log" else 0
+        if len(node.args) > position and is_eager(node.args[position]):
+            yield node.lineno, ast.get_source_segment(source, node).splitlines()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", type=Path, help="Python files or directories.")
+    args = parser.parse_args()
+
+    found = 0
+    for root in args.paths:
+        for path in sorted([root] if root.is_file() else root.rglob("*.py")):
+            for lineno, source in eager_calls(path):
+                print(f"{path}:{lineno}: {source.strip()}")
+                found += 1
+
+    print(f"{found} eagerly formatted logging calls.")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,258 @@
+"""
+Offline filter parameter tuner.
+
+Runs RollingAverage -> VelocityEstimator pipeline over recorded accelerometer traces for many parameter
+sets in parallel and writes a ranked table of scores (lower is better).
+
+Trace files are .npy or .csv arrays with columns [ax, ay, az] or [timestamp, ax, ay, az].
+
+    python -m tools.tuner traces/*.npy --search random --samples 500 --metrics drift_at_rest=1,lag=10
+
+Search space can be given as json file mapping parameter name to either a list of values
+or a range {"min": 0.001, "max": 1.0, "log": true, "num": 5} (num is used only by grid search).
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from common.math import RollingAverage, VelocityEstimator
+
+
+DEFAULT_SPACE = {
+    "process_noise_var": [0.005, 0.01, 0.02, 0.05, 0.1],
+    "measurement_noise_var": [0.005, 0.01, 0.02, 0.05],
+    "running_average_window": [1, 3, 5, 10, 20],
+    "inactivity_threshold": [0.1, 0.2, 0.4],
+    "inactivity_time": [0.01, 0.05, 0.2],
+}
+
+# Rest shorter than this, e.g. acceleration crossing zero between speeding up and slowing down, does not
+# end a stroke.
+MIN_REST_TIME = 0.1
+
+# Traces are loaded once per worker process by the pool initializer.
+worker_traces:List[Tuple[np.ndarray, float]] = []
+
+
+def load_trace(path:Path, default_dt:float) -> Tuple[np.ndarray, float]:
+    """
+    Load trace file, returns (N, 3) acceleration array and sampling interval.
+    """
+    if path.suffix == ".npy":
+        data = np.load(path)
+    else:
+        data = np.loadtxt(path, delimiter=",", ndmin=2)
+
+    if data.shape[1] == 4:
+        dt = float(np.median(np.diff(data[:, 0])))
+        return data[:, 1:], dt
+    return data[:, :3], default_dt
+
+
+def run_pipeline(acceleration:np.ndarray, dt:float, params:Dict[str, Any]) -> np.ndarray:
+    """
+    Run client filtering pipeline over trace, returns (N, 3) velocity estimates.
+    """
+    rolling_average = RollingAverage(int(params["running_average_window"]))
+    estimator = VelocityEstimator(
+        dt=dt,
+        process_noise_var=params["process_noise_var"],
+        measurement_noise_var=params["measurement_noise_var"],
+        inactivity_threshold=params["inactivity_threshold"],
+        inactivity_time_threshold=params["inactivity_time"],
+    )
+
+    velocity = np.empty_like(acceleration)
+    for index, sample in enumerate(acceleration):
+        velocity[index] = estimator.apply(rolling_average.apply(sample))
+    return velocity
+
+
+def drift_at_rest(acceleration:np.ndarray, velocity:np.ndarray, dt:float, rest_threshold:float) -> float:
+    """
+    Mean planar speed over samples where measured planar acceleration is below rest threshold.
+    """
+    at_rest = np.linalg.norm(acceleration[:, :2], axis=1) < rest_threshold
+    if not at_rest.any():
+        return 0.0
+    return float(np.linalg.norm(velocity[at_rest, :2], axis=1).mean())
+
+
+def split_strokes(acceleration:np.ndarray, dt:float, rest_threshold:float) -> List[slice]:
+    """
+    Split trace into strokes, each from start of movement up to start of the next one, so that it includes
+    the rest in which estimated speed decays.
+    """
+    moving = np.linalg.norm(acceleration[:, :2], axis=1) >= rest_threshold
+    min_rest = max(1, round(MIN_REST_TIME / dt))
+    starts = []
+    # Trace start counts as rest.
+    rest = min_rest
+    for index, value in enumerate(moving):
+        if value:
+            if rest >= min_rest:
+                starts.append(index)
+            rest = 0
+        else:
+            rest += 1
+    return [slice(start, end) for start, end in zip(starts, starts[1:] + [len(moving)])]
+
+
+def lag(acceleration:np.ndarray, velocity:np.ndarray, dt:float, rest_threshold:float) -> float:
+    """
+    Mean delay in seconds between peak of integrated planar acceleration and peak of estimated speed
+    within each stroke. Acceleration is integrated from the start of every stroke, so bias accumulated
+    over the trace does not move the reference peak.
+    """
+    strokes = split_strokes(acceleration, dt, rest_threshold)
+    if not strokes:
+        return 0.0
+    estimate = np.linalg.norm(velocity[:, :2], axis=1)
+    offsets = []
+    for stroke in strokes:
+        reference = np.linalg.norm(np.cumsum(acceleration[stroke, :2], axis=0) * dt, axis=1)
+        offsets.append(abs(int(np.argmax(estimate[stroke])) - int(np.argmax(reference))))
+    return float(np.mean(offsets)) * dt
+
+
+def rest_noise(acceleration:np.ndarray, velocity:np.ndarray, dt:float, rest_threshold:float) -> float:
+    """
+    Standard deviation of estimated planar speed.
+    """
+    return float(np.linalg.norm(velocity[:, :2], axis=1).std())
+
+
+METRICS = {
+    "drift_at_rest": drift_at_rest,
+    "lag": lag,
+    "rest_noise": rest_noise,
+}
+
+
+def init_worker(traces:List[Tuple[np.ndarray, float]]):
+    global worker_traces
+    worker_traces = traces
+
+
+def evaluate(job:Tuple[Dict[str, Any], Dict[str, float], float]) -> Tuple[Dict[str, Any], Dict[str, float], float]:
+    """
+    Score parameter set averaged over all traces.
+    """
+    params, weights, rest_threshold = job
+    totals = {name: 0.0 for name in weights}
+
+    for acceleration, dt in worker_traces:
+        velocity = run_pipeline(acceleration, dt, params)
+        for name in weights:
+            totals[name] += METRICS[name](acceleration, velocity, dt, rest_threshold)
+
+    values = {name: total / len(worker_traces) for name, total in totals.items()}
+    score = sum(weights[name] * value for name, value in values.items())
+    return params, values, score
+
+
+def expand_values(spec:Any) -> List[Any]:
+    if isinstance(spec, list):
+        return spec
+    num = spec.get("num", 5)
+    if spec.get("log"):
+        return np.geomspace(spec["min"], spec["max"], num).tolist()
+    return np.linspace(spec["min"], spec["max"], num).tolist()
+
+
+def sample_value(spec:Any, rng:random.Random) -> Any:
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    if spec.get("log"):
+        return float(np.exp(rng.uniform(np.log(spec["min"]), np.log(spec["max"]))))
+    return rng.uniform(spec["min"], spec["max"])
+
+
+def generate_params(space:Dict[str, Any], search:str, samples:int, seed:int) -> List[Dict[str, Any]]:
+    names = list(space)
+    if search == "grid":
+        grid = itertools.product(*[expand_values(space[name]) for name in names])
+        return [dict(zip(names, values)) for values in grid]
+
+    rng = random.Random(seed)
+    return [{name: sample_value(space[name], rng) for name in names} for _ in range(samples)]
+
+
+def parse_weights(metrics:str) -> Dict[str, float]:
+    weights = {}
+    for entry in metrics.split(","):
+        name, _, weight = entry.partition("=")
+        if name not in METRICS:
+            raise ValueError(f"Unknown metric: {name}, available: {', '.join(METRICS)}")
+        weights[name] = float(weight or 1.0)
+    return weights
+
+
+def write_table(results, output):
+    names = list(results[0][0]) if results else []
+    metric_names = list(results[0][1]) if results else []
+    writer = csv.writer(output)
+    writer.writerow(["rank", "score", *metric_names, *names])
+    for rank, (params, values, score) in enumerate(results, start=1):
+        writer.writerow([rank, f"{score:.6g}", *[f"{values[name]:.6g}" for name in metric_names], *[params[name] for name in names]])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline filter parameter sweep over recorded traces.")
+    parser.add_argument("traces", nargs="+", type=Path)
+    parser.add_argument("--space", type=Path, help="Json file with search space.")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--samples", type=int, default=200, help="Number of parameter sets for random search.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--metrics", default="drift_at_rest=1,lag=1", help="Comma separated metric=weight list.")
+    parser.add_argument("--rest-threshold", type=float, default=0.2, help="Planar acceleration considered rest.")
+    parser.add_argument("--dt", type=float, default=0.01, help="Sampling interval for traces without timestamps.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", type=Path, help="Csv file for ranked table, stdout by default.")
+    parser.add_argument("--top", type=int, default=0, help="Only write top N results.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    space = json.loads(args.space.read_text()) if args.space else DEFAULT_SPACE
+    weights = parse_weights(args.metrics)
+    traces = [load_trace(path, args.dt) for path in args.traces]
+    params_list = generate_params(space, args.search, args.samples, args.seed)
+
+    jobs = [(params, weights, args.rest_threshold) for params in params_list]
+    chunksize = max(1, len(jobs) // (args.workers * 4))
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(traces,)) as executor:
+        results = list(executor.map(evaluate, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - start_time
+
+    results.sort(key=lambda result: result[2])
+    if args.top:
+        results = results[:args.top]
+
+    if args.output:
+        with open(args.output, "w", newline="") as output:
+            write_table(results, output)
+    else:
+        write_table(results, sys.stdout)
+
+    print(
+        f"Evaluated {len(jobs)} parameter sets on {len(traces)} traces in {elapsed:.1f}s "
+        f"with {args.workers} workers.", file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()